@@ -1,13 +1,18 @@
 import os
+import sys
 import glob
-import json
+import argparse
 from pathlib import Path
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import OpenAIEmbeddings
-import faiss
-import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from rag_common.embedding import embed_in_batches
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.ann_index import INDEX_KINDS
+from rag_common.corpus_index import CorpusIndex
 
 # WARNING: Run this script only after having exported your Apple Notes to HTML files, running the Apple Notes Exporter script (Script Editor).
 
@@ -17,39 +22,57 @@ load_dotenv(dotenv_path=base_dir / ".env")
 
 EXPORT_ROOT = os.path.expanduser("~/Documents/_PERSO/_Python/random/RAG/apple-notes/notes")
 OUTPUT_DIR = os.path.join(EXPORT_ROOT, "index_output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Gather documents
-html_paths = glob.glob(os.path.join(EXPORT_ROOT, "**", "*.html"), recursive=True)
-docs = []
-for path in html_paths:
-    with open(path, "r", encoding="utf-8") as file:
-        text = BeautifulSoup(file, "html.parser").get_text(separator=" ", strip=True)
-        docs.append({"text": text, "path": path})
+EMBED_BATCH_SIZE = 256  # chunks per embed_documents call
+EMBED_WORKERS = 4  # batches in flight at once
 
-# Split into chunks
 splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=100)
-chunks = []
-for doc in docs:
-    for i, piece in enumerate(splitter.split_text(doc["text"])):
-        chunks.append({
-            "text": piece,
-            "source": doc["path"],
-            "chunk_id": i
-        })
-
-# Embed chunks
-embedder = OpenAIEmbeddings()
-vectors = np.array([embedder.embed_query(c["text"]) for c in chunks], dtype="float32")
-
-# Build FAISS index
-dim = vectors.shape[1]
-index = faiss.IndexFlatL2(dim)
-index.add(vectors)
-
-# Save index and metadata
-faiss.write_index(index, os.path.join(OUTPUT_DIR, "notes_index.faiss"))
-with open(os.path.join(OUTPUT_DIR, "metadata.json"), "w", encoding="utf-8") as f:
-    json.dump(chunks, f, ensure_ascii=False, indent=2)
-
-print(f"Indexed {len(chunks)} chunks from {len(docs)} documents.")
\ No newline at end of file
+
+
+def split_notes(paths):
+    """Parses exported notes and splits each one into chunks."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            text = BeautifulSoup(file, "html.parser").get_text(separator=" ", strip=True)
+        yield path, [
+            {"text": piece, "source": path, "chunk_id": i}
+            for i, piece in enumerate(splitter.split_text(text))
+        ]
+
+
+def update_index(export_root=EXPORT_ROOT, output_dir=OUTPUT_DIR, embedder=None, batch_size=EMBED_BATCH_SIZE,
+                 workers=EMBED_WORKERS, kind="auto", full=False, evaluate=False):
+    """
+    Indexes only the new or changed notes under export_root
+    (notes_index.faiss + metadata + bm25 + manifest.json in output_dir).
+    `embedder` defaults to cached OpenAI embeddings. Returns the CorpusIndex.update counts.
+    """
+    embedder = embedder or CachedEmbeddings(OpenAIEmbeddings())
+
+    def embed(texts):
+        return embed_in_batches(embedder, texts, batch_size=batch_size, max_workers=workers)
+
+    html_paths = glob.glob(os.path.join(export_root, "**", "*.html"), recursive=True)
+    corpus = CorpusIndex(output_dir, index_file="notes_index.faiss")
+    stats = corpus.update(html_paths, split_notes, embed, kind=kind, full=full, evaluate=evaluate)
+    if getattr(embedder, "cache", None) is not None:  # a caller's embedder may have no cache
+        print(embedder.cache)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index exported Apple Notes into FAISS.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per embedding request.")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS, help="Concurrent embedding requests.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and rebuild the index from scratch.")
+    parser.add_argument("--index", choices=INDEX_KINDS, default="auto", help="FAISS index type (auto: chosen from corpus size).")
+    parser.add_argument("--eval", action="store_true", help="Report recall/latency of the index against exact search.")
+    args = parser.parse_args()
+
+    stats = update_index(
+        batch_size=args.batch_size, workers=args.workers, kind=args.index, full=args.full, evaluate=args.eval
+    )
+    print(
+        f"Indexed {stats['added_chunks']} new chunks from {stats['changed_files']} new or changed notes, "
+        f"removed {stats['removed_chunks']} chunks from {stats['removed_files']} deleted notes. "
+        f"Index now holds {stats['total_chunks']} chunks from {stats['total_files']} notes."
+    )
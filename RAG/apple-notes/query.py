@@ -1,12 +1,26 @@
 import os
+import sys
 import json
-import faiss
+import contextlib
+import time
+import argparse
 import numpy as np
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.corpus_index import CorpusIndex
+from rag_common.answer_cache import AnswerCache
+from rag_common.retrieval import read_questions, hybrid_search_batch, set_search_threads
+from rag_common.context import ContextAssembler
+from rag_common.streaming import stream_tokens, format_latency, message_chunks
+from rag_common.ann_index import DEFAULT_NPROBE, DEFAULT_EF_SEARCH, index_kind, set_search_params
+from rag_common.server import DEFAULT_HOST, DEFAULT_PORT, QueryServer, ask
+from rag_common.tracing import NULL_TRACER, Tracer
+from rag_common.prompts import load_prompt
 
 # Load environment variables
 base_dir = Path(__file__).resolve().parents[2]
@@ -17,62 +31,314 @@ EXPORT_ROOT = os.path.expanduser(
     "~/Documents/_PERSO/_Python/random/RAG/apple-notes/notes"
 )
 INDEX_DIR = os.path.join(EXPORT_ROOT, "index_output")
-INDEX_PATH = os.path.join(INDEX_DIR, "notes_index.faiss")
-META_PATH = os.path.join(INDEX_DIR, "metadata.json")
 TOP_K = 30  # fixed number of chunks to retrieve
+MMR_K = 20  # chunks kept after maximal-marginal-relevance reranking
+CONTEXT_TOKENS = 3000  # prompt budget for the notes context
+
+# Index, models and caches are set up by load(), so a thin client (--connect) starts instantly
+corpus = index = metadata = bm25 = answer_cache = None
+embedder = llm = assemble_context = answer_prompt = None
+tracer = NULL_TRACER
+
+
+def load(use_bm25: bool = True, use_cache: bool = True, index_dir: str = INDEX_DIR, embedder_model=None, chat_model=None,
+         trace: str = None, profile: str = None):
+    """
+    Opens the index and sets up the models and caches used to answer questions.
+    `embedder_model` / `chat_model` replace the OpenAI embeddings and chat model (e.g. local stand-ins).
+    `trace` is a JSONL file receiving per-stage timings of every question (`profile`: a cProfile dump).
+    """
+    global corpus, index, metadata, bm25, answer_cache, embedder, llm, assemble_context, tracer, answer_prompt
 
-# Load FAISS index and metadata
-index = faiss.read_index(INDEX_PATH)
-with open(META_PATH, "r", encoding="utf-8") as f:
-    metadata = json.load(f)
+    # Open FAISS index (whichever type index.py built) and metadata without reading them into RAM:
+    # the index is memory-mapped and only the top-k metadata rows are decoded per query
+    corpus = CorpusIndex(index_dir, index_file="notes_index.faiss")
+    index, metadata = corpus.open()
+    bm25 = corpus.open_bm25() if use_bm25 else None  # keyword index built by index.py alongside FAISS
 
-# Initialize embeddings and LLM
-embedder = OpenAIEmbeddings()
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    # Answers to earlier (near-identical) questions, valid until index.py rewrites the index (or the prompt changes)
+    answer_cache = AnswerCache("apple-notes", f"{corpus.version()}:{load_prompt('apple-notes-qa').fingerprint}") if use_cache else None
+
+    # Initialize embeddings and LLM
+    embedder = embedder_model or CachedEmbeddings(OpenAIEmbeddings())
+    llm = chat_model or ChatOpenAI(model="gpt-4o", temperature=0)
+
+    # Retrieved chunks overlap (chunk_overlap=100) and often repeat each other: merge neighbouring
+    # chunks of the same note, rerank the blocks with MMR and pack the result into the token budget
+    assemble_context = ContextAssembler(
+        max_tokens=CONTEXT_TOKENS,
+        mmr_k=MMR_K,
+        render=lambda block: f"Source: {block['source']}\n{block['text']}",
+    )
+    tracer = Tracer(trace, pipeline="apple-notes", profile=profile)
+    answer_prompt = load_prompt("apple-notes-qa").to_langchain()  # from RAG/prompts, no network
+
+
+def _embedding_cache_hits():
+    cache = getattr(embedder, "cache", None)  # an `embedder_model` passed to load() may have no cache
+    return cache.hits if cache is not None else 0
+
+
+def embed_queries(queries):
+    with tracer.stage("embed", queries=len(queries)) as span:
+        hits = _embedding_cache_hits()
+        vectors = np.array(embedder.embed_documents(list(queries)), dtype="float32")
+        span.set(cache_hits=_embedding_cache_hits() - hits)
+    return vectors
+
+
+def retrieve_vectors(queries, q_vecs, top_k: int = TOP_K):
+    """
+    Retrieve top_k chunks for already embedded queries: one index search over the (N, dim)
+    query matrix, fused with BM25 keyword matches. The chunks are then reranked, merged and
+    packed into the context budget.
+    Returns, per query, a list of (context_text, source_path).
+    """
+    with tracer.stage("search", queries=len(queries), top_k=top_k, hybrid=bm25 is not None):
+        all_hits = hybrid_search_batch(index, metadata, bm25, queries, q_vecs, top_k, return_vectors=True)
+    results = []
+    for q_vec, hits in zip(q_vecs, all_hits):
+        with tracer.stage("assemble", chunks=len(hits)) as span:
+            blocks = assemble_context(q_vec, hits)
+            span.tokens(tokens_out="\n".join(block["text"] for block in blocks))
+        results.append([(block["text"], block["source"]) for block in blocks])
+    return results
+
+
+def retrieve_batch(queries, top_k: int = TOP_K):
+    """
+    Retrieve top_k chunks for each of several queries with one embedding call (see retrieve_vectors).
+    Returns, per query, a list of (context_text, source_path).
+    """
+    if not queries:
+        return []
+    return retrieve_vectors(queries, embed_queries(queries), top_k)
 
 
 def retrieve(query: str, top_k: int = TOP_K):
     """
-    Retrieve top_k chunks relevant to query.
-    Returns list of (chunk_text, source_path).
+    Retrieve top_k chunks relevant to query, assembled into the context budget.
+    Returns list of (context_text, source_path).
     """
-    q_vec = np.array(embedder.embed_query(query), dtype="float32").reshape(1, -1)
-    _, indices = index.search(q_vec, top_k)
-    return [(metadata[i]["text"], metadata[i]["source"]) for i in indices[0]]
+    return retrieve_batch([query], top_k)[0]
+
+
+def build_messages(question: str, results):
+    with tracer.stage("prompt"):
+        # Build prompt with context
+        context = "\n---\n".join([
+            f"Source: {src}\n{txt}" for txt, src in results
+        ])
+        return answer_prompt.format_messages(context=context, question=question)
+
+
+def prompt_text(messages) -> str:
+    return "\n".join(message.content for message in messages)
+
+
+def complete(messages) -> str:
+    with tracer.stage("llm") as span:
+        content = llm(messages).content
+        span.tokens(tokens_in=prompt_text(messages), tokens_out=content)
+    return content
+
+
+def cached_answer(question: str):
+    """Returns (cache hit or None, question vector); the vector is reused when storing the answer."""
+    if answer_cache is None:
+        return None, None
+    with tracer.stage("embed", queries=1) as span:
+        hits = _embedding_cache_hits()
+        q_vec = embedder.embed_query(question)
+        span.set(cache_hits=_embedding_cache_hits() - hits)
+    with tracer.stage("answer_cache") as span:
+        hit = answer_cache.lookup(q_vec, question)
+        span.set(cache_hit=hit is not None)
+    return hit, q_vec
+
+
+def remember(question: str, q_vec, answer: str, results):
+    if answer_cache is not None:
+        answer_cache.put(question, q_vec, answer, [{"source": src, "text": txt} for txt, src in results])
 
 
 def answer_question(question: str) -> str:
-    # Retrieve relevant chunks
-    results = retrieve(question)
-    if not results:
-        return "No relevant notes found."
-
-    # Build prompt with context
-    context = "\n---\n".join([
-        f"Source: {src}\n{txt}" for txt, src in results
-    ])
-    system_msg = SystemMessage(
-        content="You are a helpful assistant answering questions based on the user's Apple Notes exports."
-    )
-    human_msg = HumanMessage(
-        content=(
-            f"Use the following notes context to answer the question:\n{context}\nQuestion: {question}"
-        )
-    )
-    response = llm([system_msg, human_msg])
-    return response.content
+    with tracer.request(question):
+        hit, q_vec = cached_answer(question)
+        if hit:
+            return hit["answer"]
+        # Retrieve relevant chunks
+        results = retrieve(question)
+        if not results:
+            return "No relevant notes found."
+        answer = complete(build_messages(question, results))
+        remember(question, q_vec, answer, results)
+        return answer
+
+
+def stream_answer(question: str) -> str:
+    """Like answer_question, but prints the answer token by token along with its latency."""
+    start = time.perf_counter()
+    with tracer.request(question) as request:
+        hit, q_vec = cached_answer(question)
+        if hit:
+            print(hit["answer"])
+            print(f"(cached answer to \"{hit['question']}\", similarity {hit['similarity']:.2f}, "
+                  f"{time.perf_counter() - start:.2f}s)")
+            return hit["answer"]
+        results = retrieve(question)
+        if not results:
+            print("No relevant notes found.")
+            return "No relevant notes found."
+        messages = build_messages(question, results)
+        with tracer.stage("llm", stream=True) as span:
+            answer, stats = stream_tokens(message_chunks(llm.stream(messages)), start=start)
+            span.tokens(tokens_in=prompt_text(messages), tokens_out=answer)
+        request.set(ttft_ms=round(stats["ttft"] * 1000, 3) if stats["ttft"] is not None else None)
+        print(format_latency(stats))
+        remember(question, q_vec, answer, results)
+        return answer
+
+
+def answer_batch(questions, retrieve_only=False, max_concurrency=4):
+    """
+    Bulk Q&A: embeds every question in one call, answers the ones already in the answer cache
+    from it, retrieves context for the others in one batch, then (unless retrieve_only) answers
+    them with up to max_concurrency LLM calls in flight.
+    Yields one result dict per question.
+    """
+    set_search_threads()
+    if not questions:
+        return
+    with contextlib.redirect_stdout(sys.stderr):  # keep stdout for the JSON lines
+        q_vecs = embed_queries(questions)
+    hits = [None] * len(questions)
+    if answer_cache is not None and not retrieve_only:
+        with tracer.stage("answer_cache", batch=len(questions)) as span:
+            hits = [answer_cache.lookup(q_vec, question) for question, q_vec in zip(questions, q_vecs)]
+            span.set(cache_hits=sum(hit is not None for hit in hits))
+    misses = [i for i, hit in enumerate(hits) if hit is None]
+    all_results = [None] * len(questions)
+    with contextlib.redirect_stdout(sys.stderr):
+        for i, results in zip(misses, retrieve_vectors([questions[i] for i in misses], q_vecs[misses]) if misses else []):
+            all_results[i] = results
+    answers = [None] * len(questions)
+    if not retrieve_only:
+        to_answer = [i for i in misses if all_results[i]]
+        with tracer.stage("llm", batch=len(to_answer)):
+            responses = llm.batch(
+                [build_messages(questions[i], all_results[i]) for i in to_answer],
+                config={"max_concurrency": max_concurrency},
+            )
+        for i, response in zip(to_answer, responses):
+            answers[i] = response.content
+            remember(questions[i], q_vecs[i], answers[i], all_results[i])
+    for question, hit, results, answer in zip(questions, hits, all_results, answers):
+        if hit:
+            yield {"question": question, "sources": hit["sources"], "answer": hit["answer"], "cached": True}
+            continue
+        record = {"question": question, "sources": [{"source": src, "text": txt} for txt, src in results]}
+        if not retrieve_only:
+            record["answer"] = answer or "No relevant notes found."
+            record["cached"] = False
+        yield record
+
+
+def answer_from_vector(question: str, q_vec, retrieve_only: bool = False):
+    """QueryServer handler: answers a question whose embedding was computed in a micro-batch."""
+    with tracer.request(question, server=True):
+        hit = None
+        if answer_cache is not None and not retrieve_only:
+            with tracer.stage("answer_cache") as span:
+                hit = answer_cache.lookup(q_vec, question)
+                span.set(cache_hit=hit is not None)
+        if hit:
+            return {"question": question, "answer": hit["answer"], "sources": hit["sources"], "cached": True}
+        results = retrieve_vectors([question], np.asarray(q_vec, dtype="float32").reshape(1, -1))[0]
+        record = {"question": question, "sources": [{"source": src, "text": txt} for txt, src in results], "cached": False}
+        if not retrieve_only:
+            if results:
+                record["answer"] = complete(build_messages(question, results))
+                remember(question, q_vec, record["answer"], results)
+            else:
+                record["answer"] = "No relevant notes found."
+        return record
+
+
+def server_stats():
+    stats = {"chunks": len(metadata), "index": index_kind(index)}
+    if getattr(embedder, "cache", None) is not None:
+        stats["embedding_cache"] = embedder.cache.stats()
+    if answer_cache is not None:
+        stats["answer_cache"] = answer_cache.stats()
+    return stats
+
+
+def chat_with_server(server_url: str):
+    """Thin client: the same chat loop, answered by a running `query.py --server`."""
+    print(f"⚡︎ Apple Notes RAG Interactive Chat (server: {server_url})\nType 'exit' to quit.\n")
+    while True:
+        question = input("☞ Enter your question: ").strip()
+        if question.lower() in ("exit", "quit", "q"):
+            print("Goodbye!")
+            break
+        if not question:
+            continue
+        start = time.perf_counter()
+        result = ask(server_url, question)
+        print("=== Answer ===")
+        print(result["answer"])
+        print(f"({'cached answer, ' if result['cached'] else ''}{time.perf_counter() - start:.2f}s)\n")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat with your Apple Notes.")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="IVF lists to scan per query.")
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH, help="HNSW search depth.")
+    parser.add_argument("--batch", metavar="FILE", help="Answer every question in FILE (one per line, '-' for stdin) as JSON lines.")
+    parser.add_argument("--no-stream", action="store_true", help="Print each answer only once it is complete.")
+    parser.add_argument("--vector-only", action="store_true", help="Don't fuse BM25 keyword matches into retrieval.")
+    parser.add_argument("--no-cache", action="store_true", help="Don't reuse answers to similar earlier questions.")
+    parser.add_argument("--retrieve-only", action="store_true", help="With --batch: only output the retrieved chunks.")
+    parser.add_argument("--server", action="store_true", help="Keep the index and models loaded and answer over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="With --server: address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="With --server: port to listen on.")
+    parser.add_argument("--connect", metavar="URL", help="Chat through a running server, e.g. http://127.0.0.1:8700.")
+    parser.add_argument("--trace", metavar="FILE", help="Append per-stage timings of every question to FILE (JSON lines).")
+    parser.add_argument("--profile", metavar="FILE", help="Run questions under cProfile and dump the stats to FILE on exit.")
+    args = parser.parse_args()
+
+    if args.connect:
+        chat_with_server(args.connect)
+        sys.exit()
+
+    load(use_bm25=not args.vector_only, use_cache=not args.no_cache, trace=args.trace, profile=args.profile)
+    set_search_params(index, nprobe=args.nprobe, ef_search=args.ef_search)
+
+    if args.server:
+        QueryServer(embed_queries, answer_from_vector, stats=server_stats, host=args.host, port=args.port).run()
+        sys.exit()
+
+    if args.batch:
+        for record in answer_batch(read_questions(args.batch), retrieve_only=args.retrieve_only):
+            print(json.dumps(record, ensure_ascii=False))
+        sys.exit()
+
     print("⚡︎ Apple Notes RAG Interactive Chat")
-    print(f"Loaded {len(metadata)} chunks.\nType 'exit' to quit.\n")
+    print(f"Loaded {len(metadata)} chunks ({index_kind(index)} index).\nType 'exit' to quit.\n")
     while True:
         question = input("☞ Enter your question: ").strip()
         if question.lower() in ("exit", "quit", "q"):
+            if answer_cache is not None:
+                print(answer_cache)
             print("Goodbye!")
             break
         print("Retrieving answer...\n")
-        answer = answer_question(question)
-        print("=== Answer ===")
-        print(answer)
+        if args.no_stream:
+            answer = answer_question(question)
+            print("=== Answer ===")
+            print(answer)
+        else:
+            print("=== Answer ===")
+            stream_answer(question)
         print()
\ No newline at end of file
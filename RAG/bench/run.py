@@ -0,0 +1,310 @@
+# ==========================================
+# RAG BENCHMARK & RETRIEVAL-QUALITY HARNESS
+# Runs apple-notes, pdf.py, pdf_V2.py and the Wikipedia pipeline against one fixed corpus
+# and a set of golden Q/A pairs, with deterministic local stand-ins for OpenAI
+# (hashing embeddings, stub chat-completions endpoint), and writes a diffable JSON report.
+# ==========================================
+# Each pipeline runs in its own subprocess, so its peak RSS is its own.
+#
+#   python bench/run.py                          # every pipeline, report in bench_report.json
+#   python bench/run.py --pipelines pdf -k 3 --answers --compare old_report.json
+# ==========================================
+import os
+import re
+import sys
+import html
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import unicodedata
+import importlib.util
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RAG_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(RAG_DIR)
+from rag_common.embedding_cache import EmbeddingCache, CachedEmbeddings, CachedEncoder
+from rag_common.pdf_extract import iter_pdf_pages
+from rag_common.stub_openai import StubServer
+from rag_common.prompts import load_prompt
+from stand_ins import HashingEmbeddings
+
+PIPELINES = ("apple-notes", "pdf", "pdf_V2", "wikipedia")
+GOLDEN_PATH = os.path.join(BENCH_DIR, "golden.json")
+
+# ==========================================
+# HELPERS
+# ==========================================
+def load_module(name, path):
+    """Imports a pipeline script by path (the apple-notes directory isn't a valid module name)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def normalize(text):
+    """Unicode-normalizes (PDF ligatures), lowercases and collapses whitespace before matching evidence."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+def contains_evidence(texts, evidence):
+    texts = [normalize(t) for t in texts]
+    return any(normalize(e) in t for e in evidence for t in texts)
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return {"p50": round(float(np.percentile(ms, 50)), 2), "p95": round(float(np.percentile(ms, 95)), 2)}
+
+def peak_rss_mb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024, 1)  # bytes on macOS, KiB on Linux
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def corpus_pages(corpus):
+    return [(page, text) for _, page, text in iter_pdf_pages([corpus])]
+
+# ==========================================
+# PIPELINE ADAPTERS
+# ==========================================
+# Each adapter returns (build, open): build() indexes the corpus and is timed; open() returns
+# retrieve(question, k) -> list of chunk texts, and answer(question) -> str.
+
+def apple_notes(corpus, work_dir, embedder):
+    # Stand-in for an Apple Notes export: one HTML note per page of the corpus
+    notes_dir = os.path.join(work_dir, "notes")
+    os.makedirs(notes_dir, exist_ok=True)
+    for page, text in corpus_pages(corpus):
+        with open(os.path.join(notes_dir, f"page_{page:03d}.html"), "w", encoding="utf-8") as f:
+            f.write(f"<html><body><h1>Page {page}</h1><p>{html.escape(text)}</p></body></html>")
+    index_dir = os.path.join(work_dir, "index_output")
+    notes_index = load_module("notes_index", os.path.join(RAG_DIR, "apple-notes", "index.py"))
+    notes_query = load_module("notes_query", os.path.join(RAG_DIR, "apple-notes", "query.py"))
+    embeddings = CachedEmbeddings(embedder, embedder.model_name, cache=EmbeddingCache(os.path.join(work_dir, "cache.sqlite")))
+
+    def build():
+        notes_index.update_index(notes_dir, index_dir, embedder=embeddings, full=True)
+
+    def open_():
+        notes_query.load(use_cache=False, index_dir=index_dir, embedder_model=embeddings)
+        return (lambda q, k: [text for text, _ in notes_query.retrieve(q, top_k=k)]), notes_query.answer_question
+
+    return build, open_
+
+def pdf(corpus, work_dir, embedder):
+    pipeline = load_module("pdf_pipeline", os.path.join(RAG_DIR, "pdf", "pdf.py"))
+    pipeline.INDEX_DIR = os.path.join(work_dir, "pdf_index")
+    pipeline._embedding_model = CachedEncoder(
+        embedder, embedder.model_name, cache=EmbeddingCache(os.path.join(work_dir, "cache.sqlite"))
+    )
+
+    def build():
+        pipeline.build_faiss_index([corpus], full=True)
+
+    def open_():
+        index, chunk_store, bm25 = pipeline.load_faiss_index()
+
+        def retrieve(q, k):
+            return pipeline.retrieve_relevant_chunks_batch([q], index, chunk_store, top_k=k, bm25=bm25)[0]
+
+        return retrieve, lambda q: pipeline.generate_answer(q, retrieve(q, 5))
+
+    return build, open_
+
+def pdf_v2(corpus, work_dir, embedder):
+    pdf_dir = os.path.join(work_dir, "pdfs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    shutil.copy(corpus, pdf_dir)
+    pipeline = load_module("pdf_V2_pipeline", os.path.join(RAG_DIR, "pdf", "pdf_V2.py"))
+    embeddings = CachedEmbeddings(embedder, embedder.model_name, cache=EmbeddingCache(os.path.join(work_dir, "cache.sqlite")))
+    state = {}
+
+    def build():
+        chunks = pipeline.process_documents(pipeline.load_pdfs(pdf_dir))
+        state["retriever"] = pipeline.build_faiss_vectorstore(chunks, embeddings=embeddings)
+
+    def open_():
+        retriever = state["retriever"]
+        retrieve = lambda q, k: [d.page_content for d in retriever.vectorstore.similarity_search(q, k=k)]
+        return retrieve, lambda q: pipeline.query_documents(q, retriever)
+
+    return build, open_
+
+def wikipedia(corpus, work_dir, embedder):
+    from langchain_core.documents import Document
+    from langchain_openai import ChatOpenAI
+
+    pipeline = load_module("wikipedia_pipeline", os.path.join(RAG_DIR, "wikipedia", "wikipedia_Zidane_RAG.py"))
+    embeddings = CachedEmbeddings(embedder, embedder.model_name, cache=EmbeddingCache(os.path.join(work_dir, "cache.sqlite")))
+    # Stand-in for the scraped page: the corpus pages, loaded before the timer starts like the scrape would be
+    docs = [Document(page_content=text, metadata={"source": corpus, "page": page}) for page, text in corpus_pages(corpus)]
+    state = {}
+
+    def build():
+        splits = pipeline.split_documents(docs)
+        state["store"] = pipeline.build_vector_store(splits, embeddings, os.path.join(work_dir, "wiki_index"))
+
+    def open_():
+        store = state["store"]
+        graph = pipeline.build_graph(store, ChatOpenAI(model=pipeline.CHAT_MODEL), load_prompt("rlm/rag-prompt").to_langchain())
+        retrieve = lambda q, k: [d.page_content for d in store.similarity_search(q, k=k)]
+        return retrieve, lambda q: graph.invoke({"question": q})["answer"]
+
+    return build, open_
+
+ADAPTERS = {"apple-notes": apple_notes, "pdf": pdf, "pdf_V2": pdf_v2, "wikipedia": wikipedia}
+
+# ==========================================
+# ONE PIPELINE (CHILD PROCESS)
+# ==========================================
+def run_pipeline(name, corpus, golden, k, work_dir, answers):
+    os.chdir(work_dir)  # pdf.py / pdf_V2.py create ./pdfs next to where they run
+    stub = StubServer(delay=0, first_token_delay=0).start()
+    os.environ.update(OPENAI_BASE_URL=stub.base_url, OPENAI_API_BASE=stub.base_url, OPENAI_API_KEY="stub")
+
+    build, open_ = ADAPTERS[name](corpus, work_dir, HashingEmbeddings())
+    start = time.perf_counter()
+    build()
+    build_s = time.perf_counter() - start
+    rss_after_build = peak_rss_mb(resource.RUSAGE_SELF)
+
+    retrieve, answer = open_()
+    retrieve(golden[0]["question"], k)  # warm-up (lazy loads, first mmap faults)
+    latencies, missed = [], []
+    for item in golden:
+        start = time.perf_counter()
+        texts = retrieve(item["question"], k)
+        latencies.append(time.perf_counter() - start)
+        if not contains_evidence(texts, item["evidence"]):
+            missed.append(item["question"])
+
+    result = {
+        "build_s": round(build_s, 3),
+        "peak_rss_build_mb": rss_after_build,
+        "retrieval_ms": percentiles(latencies),
+        f"recall@{k}": round(1 - len(missed) / len(golden), 4),
+        "missed": missed,
+    }
+    if answers:
+        answer_latencies = []
+        for item in golden:
+            start = time.perf_counter()
+            answer(item["question"])
+            answer_latencies.append(time.perf_counter() - start)
+        result["answer_ms"] = percentiles(answer_latencies)
+    result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF)
+    result["peak_worker_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)  # e.g. PDF extraction processes
+    stub.stop()
+    return result
+
+# ==========================================
+# REPORT
+# ==========================================
+def print_report(report):
+    k = report["k"]
+    print(f"\n{'pipeline':<12} {'build s':>8} {'peak MB':>8} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{k}':>9}")
+    for name, r in report["pipelines"].items():
+        if "error" in r:
+            print(f"{name:<12} ERROR: {r['error']}")
+            continue
+        print(
+            f"{name:<12} {r['build_s']:>8} {r['peak_rss_mb']:>8} {r['retrieval_ms']['p50']:>8} "
+            f"{r['retrieval_ms']['p95']:>8} {r[f'recall@{k}']:>9}"
+        )
+
+def compare(report, old_path):
+    """Prints how every numeric metric moved since a previous report."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+
+    def flatten(d, prefix=""):
+        for key, value in d.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)):
+                yield f"{prefix}{key}", value
+
+    print(f"\nChanges since {old_path}:")
+    for name, r in report["pipelines"].items():
+        before = dict(flatten(old.get("pipelines", {}).get(name, {})))
+        for metric, value in flatten(r):
+            if metric in before and before[metric] != value:
+                delta = value - before[metric]
+                pct = f" ({delta / before[metric]:+.0%})" if before[metric] else ""
+                print(f"  {name}.{metric}: {before[metric]} -> {value}{pct}")
+
+# ==========================================
+# MAIN EXECUTION
+# ==========================================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipelines with local stand-in models.")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=list(PIPELINES))
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="Golden Q/A file (question + evidence phrases).")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per question.")
+    parser.add_argument("--answers", action="store_true", help="Also time full answers against the stub chat endpoint.")
+    parser.add_argument("--out", default="bench_report.json", help="Where to write the JSON report.")
+    parser.add_argument("--compare", metavar="OLD_REPORT", help="Print metric changes against a previous report.")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipelines' own output.")
+    parser.add_argument("--child", choices=PIPELINES, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    corpus = os.path.normpath(os.path.join(RAG_DIR, golden["corpus"]))
+
+    if args.child:
+        result = run_pipeline(args.child, corpus, golden["questions"], args.k, args.work_dir, args.answers)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    report = {
+        "corpus": golden["corpus"],
+        "corpus_sha256": file_sha256(corpus),
+        "questions": len(golden["questions"]),
+        "k": args.k,
+        "embeddings": HashingEmbeddings().model_name,
+        "pipelines": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        for name in args.pipelines:
+            print(f"Running {name}...", flush=True)
+            work_dir = os.path.join(tmp, name)
+            os.makedirs(work_dir)
+            result_path = os.path.join(tmp, f"{name}.json")
+            command = [
+                sys.executable, os.path.abspath(__file__), "--child", name, "--golden", os.path.abspath(args.golden),
+                "-k", str(args.k), "--work-dir", work_dir, "--result", result_path,
+            ] + (["--answers"] if args.answers else [])
+            log_path = os.path.join(tmp, f"{name}.log")
+            with open(log_path, "w") as log:
+                code = subprocess.call(command, stdout=None if args.verbose else log, stderr=subprocess.STDOUT)
+            if code == 0:
+                with open(result_path, "r", encoding="utf-8") as f:
+                    report["pipelines"][name] = json.load(f)
+            else:
+                with open(log_path, "r") as log:
+                    tail = log.read().strip().splitlines()[-1:] or [""]
+                report["pipelines"][name] = {"error": f"exit code {code}: {tail[0]}"}
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print_report(report)
+    print(f"\nReport written to {args.out}")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
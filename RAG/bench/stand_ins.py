@@ -0,0 +1,58 @@
+"""
+Deterministic local stand-ins for the models the RAG pipelines call, so benchmarks need neither
+an API key nor the network and give the same retrieval results on every run.
+Chat completions are served by rag_common.stub_openai.
+"""
+import hashlib
+
+import numpy as np
+
+from rag_common.bm25 import tokenize
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+HASHING_DIM = 384  # same width as all-MiniLM-L6-v2
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words and word bigrams (log term frequency, signed buckets),
+    L2-normalized. Lexical rather than semantic, but stable across runs and machines.
+    Offers both the LangChain interface (embed_documents / embed_query) and the
+    SentenceTransformer one (encode) used by pdf.py.
+    """
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+
+    def _vector(self, text):
+        tokens = tokenize(text)
+        features = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype="float32")
+        for feature in set(features):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * (1.0 + np.log(features.count(feature)))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        if not len(sentences):
+            return np.empty((0, self.dim), dtype="float32")
+        return np.vstack([self._vector(s) for s in sentences])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def embed_documents(self, texts):
+        return [v.tolist() for v in self.encode(list(texts))]
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
@@ -0,0 +1,107 @@
+# ==========================================
+# EMBEDDING BACKEND BENCHMARK
+# Compares embedding throughput and retrieval recall of the local backends
+# (torch fp32, ONNX Runtime, int8-quantized ONNX) and index precisions (fp32, fp16, int8)
+# on the chunks of the PDFs in ./pdfs, against the current fp32 path.
+# ==========================================
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_common.ann_index import PRECISIONS, build_index
+from rag_common.local_embedding import BACKENDS, load_sentence_transformer
+from pdf import EMBEDDING_MODEL_NAME, PDF_DIR, split_pdfs
+
+# ==========================================
+# CORPUS & QUERIES
+# ==========================================
+def load_chunks(max_chunks):
+    pdf_files = [os.path.join(PDF_DIR, f) for f in os.listdir(PDF_DIR) if f.endswith(".pdf")]
+    chunks = [c["text"] for _, pieces in split_pdfs(pdf_files) if pieces for c in pieces]
+    return chunks[:max_chunks]
+
+def make_queries(chunks, n, words=12, seed=0):
+    """Pseudo-questions: the opening words of randomly sampled chunks."""
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(chunks), min(n, len(chunks)), replace=False)
+    return [" ".join(chunks[i].split()[:words]) for i in picked]
+
+# ==========================================
+# MEASUREMENTS
+# ==========================================
+def embed(model, texts, batch_size):
+    """Encodes without the embedding cache, so the backend itself is timed. Returns (vectors, seconds)."""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return np.asarray(vectors, dtype="float32"), time.perf_counter() - start
+
+def recall_at_k(found, truth, k):
+    return float(np.mean([len(set(f[:k]) & set(t[:k])) / k for f, t in zip(found, truth)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local embedding backends and index precisions.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=list(PRECISIONS))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, help="Intra-op threads (default: every core).")
+    parser.add_argument("--max-chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.max_chunks)
+    if not chunks:
+        print("No chunks to embed: add PDFs to the 'pdfs' directory first.")
+        return
+    queries = make_queries(chunks, args.queries)
+    ids = np.arange(len(chunks), dtype="int64")
+    k = min(args.k, len(chunks))
+    print(f"\n{len(chunks)} chunks, {len(queries)} queries, batch size {args.batch_size}\n")
+
+    # Reference: the current path (torch, fp32 vectors, exact flat search)
+    baseline = load_sentence_transformer(EMBEDDING_MODEL_NAME, "torch", threads=args.threads)
+    base_vectors, base_seconds = embed(baseline, chunks, args.batch_size)
+    base_queries = baseline.encode(queries, convert_to_numpy=True)
+    _, truth = build_index(base_vectors, ids, kind="flat").search(base_queries, k)
+
+    results = []
+    for backend in args.backends:
+        if backend == "torch":
+            vectors, seconds, query_vectors = base_vectors, base_seconds, base_queries
+        else:
+            model = load_sentence_transformer(EMBEDDING_MODEL_NAME, backend, threads=args.threads)
+            vectors, seconds = embed(model, chunks, args.batch_size)
+            query_vectors = model.encode(queries, convert_to_numpy=True)
+        for precision in args.precisions:
+            index = build_index(vectors, ids, kind="flat", precision=precision)
+            start = time.perf_counter()
+            _, found = index.search(np.asarray(query_vectors, dtype="float32"), k)
+            search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            results.append({
+                "backend": backend,
+                "precision": precision,
+                "chunks_per_s": round(len(chunks) / seconds, 1),
+                "speedup": round(base_seconds / seconds, 2),
+                f"recall@{k}": round(recall_at_k(found, truth, k), 4),
+                "index_bytes_per_vector": index.sa_code_size(),
+                "search_ms_per_query": round(search_ms, 3),
+            })
+
+    print(f"\n{'backend':<10} {'precision':<9} {'chunks/s':>9} {'speedup':>8} {f'recall@{k}':>10} {'bytes/vec':>9} {'ms/query':>9}")
+    for r in results:
+        print(
+            f"{r['backend']:<10} {r['precision']:<9} {r['chunks_per_s']:>9} {r['speedup']:>7}x "
+            f"{r[f'recall@{k}']:>10} {r['index_bytes_per_vector']:>9} {r['search_ms_per_query']:>9}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"chunks": len(chunks), "queries": len(queries), "k": k, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -6,22 +6,38 @@
 # MAIN GUIDE: https://python.langchain.com/docs/tutorials/rag/
 # ==========================================
 import os
+import sys
+import json
+import contextlib
+import time
 import getpass
+import argparse
 import faiss
 import numpy as np
-import PyPDF2
-from sentence_transformers import SentenceTransformer
 import openai
 import tiktoken  # Tokenizer to estimate token count
 import gc # Garbage collector for memory management
 import signal # Handles crashes gracefully
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_common.embedding_cache import CachedEncoder
+from rag_common.ann_index import INDEX_KINDS, PRECISIONS, DEFAULT_NPROBE, DEFAULT_EF_SEARCH, set_search_params
+from rag_common.corpus_index import CorpusIndex
+from rag_common.pdf_extract import ExtractionReport, iter_pdf_pages
+from rag_common.chunking import TokenChunker
+from rag_common.local_embedding import BACKENDS, cache_model_name, load_sentence_transformer
+from rag_common.retrieval import read_questions, hybrid_search_batch, set_search_threads
+from rag_common.streaming import stream_tokens, format_latency, openai_deltas
+from rag_common.server import DEFAULT_HOST, DEFAULT_PORT, QueryServer, ask
+from rag_common.prompts import load_prompt
+
 # ==========================================
 # SETTING UP OPENAI API KEY
 # ==========================================
-if not os.environ.get("OPENAI_API_KEY"):
-    openai.api_key = getpass.getpass("Enter your API key here: ")
-else:
+def set_openai_key():
+    """Asks for the API key if it isn't in the environment (only needed to answer questions)."""
+    if not os.environ.get("OPENAI_API_KEY"):
+        os.environ["OPENAI_API_KEY"] = getpass.getpass("Enter your API key here: ")
     openai.api_key = os.environ["OPENAI_API_KEY"]
 
 # ==========================================
@@ -32,51 +48,119 @@ faiss.omp_set_num_threads(1) # ensures faiss doesn't overuse CPU
 # ==========================================
 # MODELS INITIALIZATION
 # ==========================================
-# Load the embedding model:
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# The embedding model is loaded on first use (wrapped in the on-disk cache, so unchanged chunks are
+# never re-encoded). Keeping imports light also matters for the PDF extraction worker processes.
+# The backend (torch fp32, ONNX Runtime, or int8-quantized ONNX), its thread count and the batch
+# size are chosen on the command line (see rag_common.local_embedding and bench_embeddings.py).
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_CONFIG = {"backend": "torch", "threads": None, "batch_size": 32}
+_embedding_model = None
+
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        backend = EMBEDDING_CONFIG["backend"]
+        model = load_sentence_transformer(EMBEDDING_MODEL_NAME, backend, threads=EMBEDDING_CONFIG["threads"])
+        _embedding_model = CachedEncoder(model, cache_model_name(EMBEDDING_MODEL_NAME, backend))
+    return _embedding_model
 
 # Path to the directory storing the PDFs:
 PDF_DIR = "./pdfs"
 os.makedirs(PDF_DIR, exist_ok=True)
 
+# Path to the persisted index (FAISS index, chunk store and per-PDF fingerprints):
+INDEX_DIR = "./pdf_index"
+
+# Memory cap per PDF extraction worker (a pathological PDF fails instead of exhausting RAM):
+EXTRACT_WORKER_MEMORY_MB = 2048
+
+# Chunk size in tokens (same tiktoken encoding as trim_context), so top_k chunks fit the context:
+CHUNK_TOKENS = 350
+
 # ==========================================
 # TEXT EXTRACTION FROM PDF
 # ==========================================
-def extract_text_from_pdf(pdf_path):
-    """Extracts text from a given PDF file."""
-    with open(pdf_path, "rb") as file:
-        reader = PyPDF2.PdfReader(file)
-        text = "\n".join([page.extract_text() or "" for page in reader.pages])
-    return text.strip()
+def split_pdfs(pdf_paths):
+    """
+    Extracts PDFs in parallel worker processes (across files and page ranges) and splits each
+    one into token-sized chunks that respect headings and pages, without running headers/footers.
+    Yields (pdf_path, chunks) per file, or (pdf_path, None) if the file couldn't be fully extracted.
+    """
+    report = ExtractionReport()
+    pages = iter_pdf_pages(pdf_paths, max_worker_memory_mb=EXTRACT_WORKER_MEMORY_MB, report=report)
+    seen = set()
+    for path, chunks in TokenChunker(max_tokens=CHUNK_TOKENS).chunk_records(pages):
+        seen.add(path)
+        yield path, None if report.failed(path) else chunks
+    for path in pdf_paths:  # files with no extracted pages at all
+        if path not in seen:
+            yield path, None if report.failed(path) else []
+    print("\nExtraction report:")
+    report.print_summary()
 
 # ==========================================
 # TEXT INDEXING - FAISS
 # ==========================================
-def build_faiss_index(text_chunks):
-    """Embeds text chunks and stores them in a FAISS index."""
-    embeddings = embedding_model.encode(text_chunks, convert_to_numpy=True, show_progress_bar=True, batch_size=32)
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+def embed_chunks(texts):
+    """Encodes chunk texts with the local embedding model."""
+    return get_embedding_model().encode(
+        texts, convert_to_numpy=True, show_progress_bar=True, batch_size=EMBEDDING_CONFIG["batch_size"]
+    )
 
-    print(f"\nIndexed {len(text_chunks)} text chunks in FAISS.\n")  # Debugging
-    return index, text_chunks
+def build_faiss_index(pdf_files, kind="auto", precision="fp32", full=False, evaluate=False):
+    """
+    Embeds the chunks of new or changed PDFs into the persisted FAISS index
+    (Flat, IVF, HNSW or IVF-PQ, see rag_common.ann_index), storing vectors as fp32, fp16 or int8.
+    Unchanged PDFs are skipped.
+    """
+    stats = CorpusIndex(INDEX_DIR).update(
+        pdf_files, split_pdfs, embed_chunks, kind=kind, precision=precision, full=full, evaluate=evaluate,
+        settings={
+            "chunker": f"tokens-{CHUNK_TOKENS}",
+            "model": cache_model_name(EMBEDDING_MODEL_NAME, EMBEDDING_CONFIG["backend"]),
+        },
+    )
+    print(
+        f"\nIndexed {stats['added_chunks']} new chunks from {stats['changed_files']} new or changed PDFs, "
+        f"{stats['total_chunks']} chunks in FAISS.\n"
+    )  # Debugging
+    if _embedding_model is not None:  # only loaded if something had to be embedded
+        print(_embedding_model.cache)
+
+def load_faiss_index():
+    """
+    Opens the persisted index and chunk store (memory-mapped, so this takes milliseconds)
+    and the BM25 keyword index built alongside them.
+    """
+    corpus = CorpusIndex(INDEX_DIR)
+    index, chunk_store = corpus.open()
+    return index, chunk_store, corpus.open_bm25()
 
 # ==========================================
 # RETRIEVAL FUNCTION
 # ==========================================
-def retrieve_relevant_chunks(query, index, text_chunks, top_k=3):
-    """Finds the most relevant text chunks based on the user's query."""
-    query_embedding = embedding_model.encode([query], convert_to_numpy=True)
-    
+def format_hit(hit):
+    # Each excerpt keeps its provenance, so the answer can point back to the page
+    return f"[{os.path.basename(hit['source'])}, p. {hit['page']}]\n{hit['text']}"
+
+def retrieve_relevant_chunks_batch(queries, index, chunk_store, top_k=3, bm25=None):
+    """
+    Finds the most relevant text chunks for several queries at once: the queries are encoded
+    in one call and searched with a single FAISS search, fused with BM25 keyword matches when
+    `bm25` is given. Returns one list of excerpts per query.
+    """
+    if not queries:
+        return []
     if not index.is_trained or index.ntotal == 0:
         print("\n FAISS index is empty! Skipping retrieval.")
-        return []
-    
-    distances, indices = index.search(query_embedding, min(top_k, index.ntotal))
+        return [[] for _ in queries]
 
-    retrieved_texts = [text_chunks[i] for i in indices[0] if i < len(text_chunks)]
+    query_embeddings = get_embedding_model().encode(queries, convert_to_numpy=True)
+    return [[format_hit(hit) for hit in hits] for hits in hybrid_search_batch(index, chunk_store, bm25, queries, query_embeddings, top_k)]
 
+def retrieve_relevant_chunks(query, index, chunk_store, top_k=3, bm25=None):
+    """Finds the most relevant text chunks based on the user's query."""
+    retrieved_texts = retrieve_relevant_chunks_batch([query], index, chunk_store, top_k=top_k, bm25=bm25)[0]
     print(f"\nRetrieved {len(retrieved_texts)} chunks for query: '{query}'")
     return retrieved_texts
 
@@ -101,49 +185,154 @@ def trim_context(relevant_chunks, max_tokens=4000):
 # ==========================================
 # RESPONSE GENERATION FUNCTION
 # ==========================================
-def generate_answer(query, relevant_chunks):
-    """Generates an AI response using GPT-4 based on retrieved document excerpts."""
+def generate_answer(query, relevant_chunks, stream=False, start=None):
+    """
+    Generates an AI response using GPT-4 based on retrieved document excerpts.
+    With stream=True the answer is printed token by token as it arrives, followed by the
+    time to first token and total latency (measured from `start`, default: now).
+    """
     context = trim_context(relevant_chunks)
     
     if not context:
+        if stream:
+            print("\n💡 Answer:\n", "I don't know based on the provided documents.")
         return "I don't know based on the provided documents."
 
-    prompt = f"""
-    You are an AI assistant that answers questions strictly based on the provided document excerpts.
-    If the context does not contain the answer, simply respond: "I don't know based on the provided documents."
-
-    Context:
-    {context}
-
-    Question: {query}
-    Answer:
-    """
+    messages = load_prompt("pdf-qa").format_messages(context=context, question=query)  # local file, read once
 
     client = openai.Client()
+    if stream:
+        response = client.chat.completions.create(
+            model="gpt-4",
+            messages=messages,
+            stream=True,
+        )
+        print("\n💡 Answer:")
+        answer, stats = stream_tokens(openai_deltas(response), start=start)
+        print(format_latency(stats))
+        return answer
+
     response = client.chat.completions.create(
         model="gpt-4",
-        messages=[{"role": "user", "content": prompt}]
+        messages=messages
     )
 
     return response.choices[0].message.content  # Extract answer
 
+# ==========================================
+# BATCH MODE
+# ==========================================
+def answer_batch(questions, index, chunk_store, top_k=5, retrieve_only=False, bm25=None):
+    """Retrieves for all questions in one search, then prints one JSON line per question."""
+    set_search_threads()  # one large search can use every core, unlike the interactive loop
+    all_chunks = retrieve_relevant_chunks_batch(questions, index, chunk_store, top_k=top_k, bm25=bm25)
+    for question, chunks in zip(questions, all_chunks):
+        result = {"question": question, "chunks": chunks}
+        if not retrieve_only:
+            with contextlib.redirect_stdout(sys.stderr):  # keep stdout for the JSON lines
+                result["answer"] = generate_answer(question, chunks)
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+# ==========================================
+# QUERY SERVER & THIN CLIENT
+# ==========================================
+def run_server(index, chunk_store, bm25, host=DEFAULT_HOST, port=DEFAULT_PORT, top_k=5):
+    """Keeps the embedding model and index loaded and answers POST /query requests (see rag_common.server)."""
+    def embed_queries(texts):
+        return get_embedding_model().encode(texts, convert_to_numpy=True)
+
+    def answer(question, query_vector, retrieve_only=False):
+        hits = hybrid_search_batch(index, chunk_store, bm25, [question], query_vector.reshape(1, -1), top_k)[0]
+        result = {"question": question, "chunks": [format_hit(hit) for hit in hits]}
+        if not retrieve_only:
+            result["answer"] = generate_answer(question, result["chunks"])
+        return result
+
+    def stats():
+        return {"chunks": len(chunk_store), "embedding_cache": get_embedding_model().cache.stats()}
+
+    set_search_threads()  # concurrent requests search from several threads
+    QueryServer(embed_queries, answer, stats=stats, host=host, port=port).run()
+
+def chat_with_server(server_url):
+    """The interactive Q&A loop, answered by a running `pdf.py server` (nothing is loaded locally)."""
+    print(f"\nConnected to {server_url}. Ready for questions! Type 'exit' to quit.")
+    while True:
+        query = input("\n❓ Your question: ").strip()
+
+        if query.lower() == "exit":
+            print("\nExiting. Thanks for using the PDF Q&A system!")
+            break
+
+        start = time.perf_counter()
+        result = ask(server_url, query)
+        print("\n💡 Answer:\n", result["answer"])
+        print(f"({len(result['chunks'])} excerpts, {time.perf_counter() - start:.2f}s)")
+
 # ==========================================
 # MAIN EXECUTION
 # ==========================================
 def main():
-    """Loads PDFs, builds FAISS index, and starts an interactive Q&A loop."""
-    
+    """
+    build: (re)indexes new or changed PDFs and saves the index to disk.
+    serve (default): refreshes the index if a PDF changed, loads it and starts an interactive Q&A loop.
+    batch: answers every question of --questions (one per line, "-" for stdin) and prints JSON lines.
+    server: refreshes the index, then keeps it and the models loaded behind an HTTP API (/query, /stats).
+    With --connect URL, the Q&A loop is answered by a running server instead.
+    """
+    parser = argparse.ArgumentParser(description="Ask questions about your PDFs.")
+    parser.add_argument("command", nargs="?", choices=["build", "serve", "batch", "server"], default="serve")
+    parser.add_argument("--full", action="store_true", help="Rebuild the index from scratch.")
+    parser.add_argument("--index", choices=INDEX_KINDS, default="auto", help="FAISS index type (auto: chosen from corpus size).")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32", help="How the index stores vectors (fp16/int8 use 2x/4x less memory).")
+    parser.add_argument("--embed-backend", choices=BACKENDS, default="torch", help="Local embedding runtime (onnx-int8: quantized weights).")
+    parser.add_argument("--embed-batch-size", type=int, default=32, help="Chunks per embedding forward pass.")
+    parser.add_argument("--threads", type=int, help="Embedding and index-build threads (default: every core).")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="IVF lists to scan per query.")
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH, help="HNSW search depth.")
+    parser.add_argument("--eval", action="store_true", help="Report recall/latency of the index against exact search.")
+    parser.add_argument("--vector-only", action="store_true", help="Don't fuse BM25 keyword matches into retrieval.")
+    parser.add_argument("--no-stream", action="store_true", help="serve: print each answer only once it is complete.")
+    parser.add_argument("--questions", default="-", help="batch: file with one question per line ('-' for stdin).")
+    parser.add_argument("--retrieve-only", action="store_true", help="batch: only return the retrieved chunks.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="server: address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server: port to listen on.")
+    parser.add_argument("--connect", metavar="URL", help="Ask a running server, e.g. http://127.0.0.1:8700.")
+    args = parser.parse_args()
+
+    if args.connect:
+        chat_with_server(args.connect)
+        return
+
     pdf_files = [os.path.join(PDF_DIR, f) for f in os.listdir(PDF_DIR) if f.endswith(".pdf")]
     
     if not pdf_files:
         print("No PDF files found in the 'pdfs' directory. Please add PDFs and try again.")
         return
     
-    all_text = "\n".join([extract_text_from_pdf(pdf) for pdf in pdf_files])
-    text_chunks = all_text.split("\n\n")  # Simple chunking by paragraphs
+    EMBEDDING_CONFIG.update(backend=args.embed_backend, threads=args.threads, batch_size=args.embed_batch_size)
+
+    # Update the FAISS index: only PDFs whose fingerprint changed are re-extracted and re-embedded
+    # (training and adding to the index may use every core; queries go back to a single thread)
+    set_search_threads(args.threads)
+    build_faiss_index(pdf_files, kind=args.index, precision=args.precision, full=args.full, evaluate=args.eval)
+    faiss.omp_set_num_threads(1)
+    if args.command == "build":
+        return
 
-    # Build FAISS index
-    index, chunks = build_faiss_index(text_chunks)
+    if not (args.command == "batch" and args.retrieve_only):
+        set_openai_key()
+    index, chunk_store, bm25 = load_faiss_index()
+    if args.vector_only:
+        bm25 = None
+    set_search_params(index, nprobe=args.nprobe, ef_search=args.ef_search)
+
+    if args.command == "batch":
+        answer_batch(read_questions(args.questions), index, chunk_store, retrieve_only=args.retrieve_only, bm25=bm25)
+        return
+    if args.command == "server":
+        run_server(index, chunk_store, bm25, host=args.host, port=args.port)
+        return
 
     print("\nReady for questions! Type 'exit' to quit.")
 
@@ -154,14 +343,18 @@ def main():
             print("\nExiting. Thanks for using the PDF Q&A system!")
             break
 
-        relevant_chunks = retrieve_relevant_chunks(query, index, text_chunks, top_k=5)  # Increase retrieval depth
+        start = time.perf_counter()
+        relevant_chunks = retrieve_relevant_chunks(query, index, chunk_store, top_k=5, bm25=bm25)  # Increase retrieval depth
 
         if not relevant_chunks:
             print("\nNo relevant text found! Try rephrasing your question.\n")
             continue
 
-        answer = generate_answer(query, relevant_chunks)
-        print("\n💡 Answer:\n", answer)
+        if args.no_stream:
+            answer = generate_answer(query, relevant_chunks)
+            print("\n💡 Answer:\n", answer)
+        else:
+            generate_answer(query, relevant_chunks, stream=True, start=start)
 
 # ==========================================
 # RUN MAIN FUNCTION
@@ -10,25 +10,33 @@
 # SETUP
 import getpass
 import os
+import sys
 import openai
 from langchain_openai import OpenAI
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain.chains import RetrievalQA
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.pdf_extract import ExtractionReport, iter_pdf_pages
+
 # ==========================================
 # SETTING UP OPENAI API KEY
 # ==========================================
 
 # os.environ["OPENAI_API_KEY"] = "sk-"
 
-if not os.environ.get("OPENAI_API_KEY"):
-    api_key = getpass.getpass("Enter your API key here: ")
-    os.environ["OPENAI_API_KEY"] = api_key
-else:
+api_key = None
+
+def set_api_key():
+    """Asks for the API key if it isn't in the environment."""
+    global api_key
+    if not os.environ.get("OPENAI_API_KEY"):
+        os.environ["OPENAI_API_KEY"] = getpass.getpass("Enter your API key here: ")
     api_key = os.environ["OPENAI_API_KEY"]
 
 # ==========================================
@@ -38,13 +46,15 @@ PDF_DIR = "./pdfs"
 os.makedirs(PDF_DIR, exist_ok=True)
 
 def load_pdfs(directory):
-    """Loads all PDFs in a directory and extracts text."""
-    documents = []
-    for filename in os.listdir(directory):
-        if filename.endswith(".pdf"):
-            pdf_path = os.path.join(directory, filename)
-            loader = PyPDFLoader(pdf_path)
-            documents.extend(loader.load())
+    """Loads all PDFs in a directory and extracts text, one document per page (in parallel worker processes)."""
+    pdf_paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".pdf")]
+    report = ExtractionReport()
+    documents = [
+        Document(page_content=text, metadata={"source": path, "page": page - 1})  # 0-based, like PyPDFLoader
+        for path, page, text in iter_pdf_pages(pdf_paths, report=report)
+    ]
+    print("Extraction report:")
+    report.print_summary()
     return documents
     
 def process_documents(documents):
@@ -55,11 +65,12 @@ def process_documents(documents):
 # ==========================================
 # RETRIEVER - FAISS VECTORSTORE FOR EMBEDDINGS
 # ==========================================
-def build_faiss_vectorstore(chunks):
-    """Embeds text chunks and stores them in a FAISS index."""
-    embeddings = OpenAIEmbeddings(openai_api_key = api_key)
+def build_faiss_vectorstore(chunks, embeddings=None):
+    """Embeds text chunks and stores them in a FAISS index (cached OpenAI embeddings unless `embeddings` is given)."""
+    embeddings = embeddings or CachedEmbeddings(OpenAIEmbeddings(openai_api_key = api_key))
     vectorstore = FAISS.from_documents(chunks, embeddings)
     retriever = VectorStoreRetriever(vectorstore = vectorstore)
+    print(embeddings.cache)
     return retriever
 
 # ==========================================
@@ -78,6 +89,7 @@ def query_documents(query, retriever):
 # MAIN EXECUTION
 # ==========================================
 def main():
+    set_api_key()
     pdf_documents = load_pdfs(PDF_DIR)
     if not pdf_documents:
         print("No PDFs found. Add PDFs to the 'pdfs' directory and try again.")
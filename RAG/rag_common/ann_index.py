@@ -0,0 +1,200 @@
+import math
+import time
+
+import faiss
+import numpy as np
+
+INDEX_KINDS = ("auto", "flat", "ivf", "hnsw", "ivfpq")
+PRECISIONS = ("fp32", "fp16", "int8")  # how flat / IVF / HNSW indexes store vectors (IVF-PQ has its own codes)
+_STORAGE = {"fp32": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+FLAT_MAX = 50_000  # below this an exhaustive scan is fast enough
+IVF_MAX = 1_000_000  # above this, compress the vectors with PQ as well
+TRAIN_SIZE = 100_000  # vectors sampled to train IVF / PQ
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+
+
+def choose_kind(n: int) -> str:
+    """Picks an index type from the corpus size."""
+    if n < FLAT_MAX:
+        return "flat"
+    if n < IVF_MAX:
+        return "ivf"
+    return "ivfpq"
+
+
+def _nlist(n: int) -> int:
+    # ~4*sqrt(n) lists, but keep at least 39 training points per list
+    return max(1, min(int(4 * math.sqrt(n)), n // 39, 65536))
+
+
+def _pq_m(dim: int) -> int:
+    # Sub-quantizers of ~16 dims each; m has to divide dim
+    m = max(1, dim // 16)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def factory_string(kind: str, n: int, dim: int, precision: str = "fp32") -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    storage = _STORAGE[precision]
+    if kind == "flat":
+        return f"IDMap2,{storage}"
+    if kind == "hnsw":
+        return "IDMap2,HNSW32" if precision == "fp32" else f"IDMap2,HNSW32_{storage}"
+    if kind == "ivf":
+        return f"IVF{_nlist(n)},{storage}"
+    if kind == "ivfpq":
+        return f"IVF{_nlist(n)},PQ{_pq_m(dim)}"
+    raise ValueError(f"Unknown index kind: {kind} (expected one of {', '.join(INDEX_KINDS)})")
+
+
+def build_index(vectors, ids, kind="auto", precision="fp32", train_size=TRAIN_SIZE, seed=0):
+    """
+    Builds a FAISS index over `vectors` (float32, shape (n, dim)) with 64-bit `ids`.
+    `kind` is one of INDEX_KINDS; "auto" chooses from the corpus size.
+    `precision` (PRECISIONS) stores the vectors as float32, float16 or int8 scalar-quantized codes.
+    IVF variants and int8 codes are trained on a random sample of at most `train_size` vectors.
+    """
+    n, dim = vectors.shape
+    if kind == "auto":
+        kind = choose_kind(n)
+    if kind == "ivfpq" and n < 256 * 39:
+        print(f"Only {n} vectors, too few to train PQ codebooks; falling back to IVF-Flat.")
+        kind = "ivf"
+
+    spec = factory_string(kind, n, dim, precision)
+    index = faiss.index_factory(dim, spec)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(n, train_size), replace=False)]
+        index.train(sample)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    set_search_params(index, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH)
+    print(f"Built {kind} index ({spec}) over {n} vectors.")
+    return index
+
+
+def _inner(index):
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_kind(index) -> str:
+    """Tells which INDEX_KINDS entry an index (built or loaded from disk) corresponds to."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def index_precision(index) -> str:
+    """Tells which PRECISIONS entry an index stores its vectors in (IVF-PQ reports fp32)."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    sq = getattr(inner, "sq", None)
+    if sq is None:
+        return "fp32"
+    if sq.qtype == faiss.ScalarQuantizer.QT_fp16:
+        return "fp16"
+    if sq.qtype == faiss.ScalarQuantizer.QT_8bit:
+        return "int8"
+    return "fp32"
+
+
+def supports_removal(index) -> bool:
+    """HNSW graphs can't delete vectors, so those indexes have to be rebuilt instead."""
+    return index_kind(index) != "hnsw"
+
+
+def reconstruct(index, ids):
+    """
+    The vectors stored under `ids`, shape (len(ids), dim), read back from the index instead of
+    re-embedding the texts (IVF-PQ and int8 indexes return their approximations).
+    """
+    ids = np.asarray(ids, dtype="int64").ravel()
+    if not len(ids):
+        return np.empty((0, index.d), dtype="float32")
+    if index_kind(index) in ("ivf", "ivfpq"):
+        ivf = faiss.extract_index_ivf(index)
+        if ivf.direct_map.type != faiss.DirectMap.Hashtable:  # built once, on first use
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype("float32")
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Applies query-time tuning: nprobe for IVF indexes, efSearch for HNSW. Others ignore it."""
+    kind = index_kind(index)
+    if kind in ("ivf", "ivfpq") and nprobe:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    elif kind == "hnsw" and ef_search:
+        _inner(index).hnsw.efSearch = ef_search
+
+
+def evaluate_recall(index, vectors, ids, k=10, n_queries=200, seed=1, queries=None):
+    """
+    Reports recall@k and per-query latency of `index` against an exact flat index over the
+    same vectors, for a sweep of nprobe / efSearch. `queries` are embeddings of real questions;
+    without them, `n_queries` of the vectors are held out: left out of the exact index and of
+    a copy of `index` (rebuilt for HNSW), so that no query finds itself.
+    Returns a list of result dicts (also printed as a table).
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if queries is None:
+        if len(vectors) < 2:
+            return []
+        rng = np.random.default_rng(seed)
+        held_out = rng.choice(len(vectors), min(n_queries, len(vectors) - 1), replace=False)
+        queries, held_out_ids = vectors[held_out], ids[held_out]
+        keep = np.ones(len(vectors), dtype=bool)
+        keep[held_out] = False
+        vectors, ids = vectors[keep], ids[keep]
+        if supports_removal(index):
+            index = faiss.clone_index(index)
+            index.remove_ids(held_out_ids)
+        else:
+            index = build_index(vectors, ids, kind=index_kind(index), precision=index_precision(index))
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    truth = ids[truth]
+
+    kind = index_kind(index)
+    if kind in ("ivf", "ivfpq"):
+        sweep = [("nprobe", p) for p in (1, 4, 16, 64, 256) if p <= faiss.extract_index_ivf(index).nlist]
+    elif kind == "hnsw":
+        sweep = [("efSearch", ef) for ef in (16, 32, 64, 128, 256)]
+    else:
+        sweep = [(None, None)]
+
+    results = []
+    for param, value in sweep:
+        if param == "nprobe":
+            set_search_params(index, nprobe=value)
+        elif param == "efSearch":
+            set_search_params(index, ef_search=value)
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        results.append({"param": param, "value": value, "recall": float(recall), "latency_ms": latency_ms})
+    set_search_params(index, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH)
+
+    print(f"\nRecall@{k} vs exact search ({len(queries)} queries, exact: {exact_ms:.3f} ms/query)")
+    for r in results:
+        label = f"{r['param']}={r['value']}" if r["param"] else kind
+        print(f"  {label:<14} recall={r['recall']:.3f}  latency={r['latency_ms']:.3f} ms/query")
+    return results
@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from rag_common.bm25 import tokenize
+
+DEFAULT_ANSWER_CACHE_PATH = os.environ.get(
+    "RAG_ANSWER_CACHE", str(Path(__file__).resolve().parents[1] / ".cache" / "answers.sqlite")
+)
+DEFAULT_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+# Also reject a hit when one question names a number or a proper noun the other doesn't mention (see
+# key_terms): embeddings of questions that differ only in a name or a date often score above the threshold
+DEFAULT_MATCH_TERMS = os.environ.get("RAG_ANSWER_CACHE_MATCH_TERMS", "1") != "0"
+DEFAULT_TTL = 7 * 24 * 3600  # seconds
+DEFAULT_MAX_ENTRIES = 2000  # per namespace
+
+
+STOPWORDS = frozenset(
+    "a an the of in on at to for from by with about and or is are was were be been do does did what which who "
+    "whom whose when where why how this that these those it its my your our their me you i we they there "
+    "le la les un une des du de et ou est sont a au aux en dans sur pour par avec que qui quoi quel quelle "
+    "quels quelles quand comment pourquoi ce cet cette ces mon ma mes ton ta tes son sa ses je tu il elle nous vous ils elles".split()
+)
+
+
+def key_terms(question):
+    """
+    Numbers and proper nouns of a question (capitalized words that don't start a sentence), normalized
+    like BM25 tokens. Returns (key terms, all the question's tokens).
+    """
+    keys = set()
+    for match in re.finditer(r"\w+", question):
+        word, before = match.group(), question[:match.start()].rstrip()
+        starts_sentence = not before or before[-1] in ".?!:"
+        if any(c.isdigit() for c in word) or (word[0].isupper() and not starts_sentence):
+            keys.update(t for t in tokenize(word) if t not in STOPWORDS)
+    return frozenset(keys), frozenset(tokenize(question))
+
+
+def _same_key_terms(a, b):
+    """True unless one question has a number or proper noun that the other doesn't contain at all."""
+    (keys_a, tokens_a), (keys_b, tokens_b) = a, b
+    return keys_a <= tokens_b and keys_b <= tokens_a
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32").ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers in SQLite, keyed by the question embedding.
+    A question whose cosine similarity to a stored one reaches `threshold` gets the stored
+    answer and sources back, so paraphrases ("When did Zidane retire?", "What year did Zidane
+    stop playing?") share an answer. With `match_terms`, a hit is rejected when one question
+    has a number or a proper noun the other lacks: "revenue in 2021" doesn't get the answer
+    stored for "revenue in 2022", which the embeddings alone often can't tell apart.
+    Entries belong to a `namespace` (one per pipeline) and an `index_version`: when the index
+    is rebuilt the version changes and older entries are dropped.
+    Entries expire after `ttl` seconds; past `max_entries`, the least recently used go first.
+    """
+
+    def __init__(self, namespace, index_version, path=DEFAULT_ANSWER_CACHE_PATH,
+                 threshold=DEFAULT_THRESHOLD, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 match_terms=DEFAULT_MATCH_TERMS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.namespace = namespace
+        self.index_version = str(index_version)
+        self.threshold = threshold
+        self.match_terms = match_terms
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, index_version TEXT NOT NULL, "
+            "question TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL, sources TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_answers_ns ON answers(namespace, last_used)")
+        # Answers computed against another version of the index may cite chunks that no longer exist
+        self._db.execute(
+            "DELETE FROM answers WHERE namespace = ? AND (index_version != ? OR created < ?)",
+            (namespace, self.index_version, time.time() - ttl),
+        )
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        """Keeps the live entries' ids, creation times, unit vectors and key terms in memory for the lookup."""
+        rows = self._db.execute(
+            "SELECT id, created, vector, question FROM answers WHERE namespace = ? ORDER BY id", (self.namespace,)
+        ).fetchall()
+        self._ids = [r[0] for r in rows]
+        self._terms = [key_terms(r[3]) for r in rows]
+        self._created = np.array([r[1] for r in rows], dtype="float64")
+        self._vectors = (
+            np.vstack([np.frombuffer(r[2], dtype="float32") for r in rows]) if rows else None
+        )
+
+    def lookup(self, vector, question=None):
+        """
+        Returns {"question", "answer", "sources", "similarity"} for the closest stored question
+        if it is similar enough (and, with `match_terms`, has the same numbers and proper nouns as
+        `question`) and not expired, else None.
+        """
+        terms = key_terms(question) if self.match_terms and question is not None else None
+        with self._lock:
+            best = None
+            if self._vectors is not None:
+                similarities = self._vectors @ _unit(vector)
+                similarities[self._created < time.time() - self.ttl] = -1.0
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                for i in candidates[np.argsort(-similarities[candidates])]:
+                    if terms is None or _same_key_terms(self._terms[i], terms):
+                        best = (self._ids[i], float(similarities[i]))
+                        break
+            if best is None:
+                self.misses += 1
+                return None
+            entry_id, similarity = best
+            self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+            self._db.commit()
+            question, answer, sources = self._db.execute(
+                "SELECT question, answer, sources FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self.hits += 1
+        return {"question": question, "answer": answer, "sources": json.loads(sources), "similarity": similarity}
+
+    def put(self, question, vector, answer, sources=()):
+        """Stores an answer; `sources` is any JSON-serializable list (e.g. source paths and excerpts)."""
+        now = time.time()
+        with self._lock:
+            vector = _unit(vector)
+            entry_id = self._db.execute(
+                "INSERT INTO answers (namespace, index_version, question, vector, answer, sources, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, self.index_version, question, vector.tobytes(), answer,
+                 json.dumps(list(sources), ensure_ascii=False), now, now),
+            ).lastrowid
+            evicted = []
+            excess = len(self._ids) + 1 - self.max_entries
+            if excess > 0:
+                evicted = [r[0] for r in self._db.execute(
+                    "SELECT id FROM answers WHERE namespace = ? ORDER BY last_used LIMIT ?", (self.namespace, excess)
+                )]
+                self._db.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in evicted])
+            self._db.commit()
+
+            # Update the in-memory copy instead of reading every entry back
+            self._ids.append(entry_id)
+            self._terms.append(key_terms(question))
+            self._created = np.append(self._created, now)
+            self._vectors = vector[None] if self._vectors is None else np.vstack([self._vectors, vector])
+            if evicted:
+                keep = ~np.isin(self._ids, evicted)
+                self._ids = [i for i, k in zip(self._ids, keep) if k]
+                self._terms = [t for t, k in zip(self._terms, keep) if k]
+                self._created, self._vectors = self._created[keep], self._vectors[keep]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers WHERE namespace = ?", (self.namespace,))
+            self._db.commit()
+            self._load()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._ids),
+        }
+
+    def __str__(self):
+        s = self.stats()
+        return (
+            f"Answer cache: {s['hits']} hits, {s['misses']} misses "
+            f"({s['hit_rate']:.0%} hit rate), {s['entries']} stored answers"
+        )
@@ -0,0 +1,154 @@
+import os
+import re
+import shutil
+import unicodedata
+
+import numpy as np
+
+FORMAT_VERSION = 1  # bumped when tokenization or layout changes; older files are rebuilt
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str):
+    """Lowercases, strips accents and splits on anything that isn't a letter or a digit."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+
+class BM25Index:
+    """
+    Inverted index over chunk texts, scored with Okapi BM25, persisted as a directory of `.npy` files.
+
+    Postings are kept as parallel arrays (term, chunk id, term frequency) sorted by term, with
+    an offsets array pointing at each term's slice; chunks can be added and removed by ID, so
+    the index is updated alongside the FAISS index instead of being rebuilt.
+    Opening is cheap whatever the corpus size: the arrays are memory-mapped, so a query only reads
+    the postings of its terms, and the term -> id lookup is built on first use.
+    """
+
+    ARRAYS = ("vocab", "post_terms", "post_ids", "post_tf", "doc_ids", "doc_lens", "offsets")
+
+    def __init__(self, path):
+        self.path = path
+        self.clear()
+        version_path = os.path.join(path, "version.npy")
+        if os.path.exists(version_path) and int(np.load(version_path)) == FORMAT_VERSION:
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in self.ARRAYS}
+            self._vocab = arrays.pop("vocab")
+            self._offsets = arrays.pop("offsets")
+            for name, array in arrays.items():
+                setattr(self, name, array)
+            self.loaded = True
+
+    def clear(self):
+        self.loaded = False
+        self._vocab = np.empty(0, dtype="str")
+        self._term_index = None
+        self.post_terms = np.empty(0, dtype="int32")
+        self.post_ids = np.empty(0, dtype="int64")
+        self.post_tf = np.empty(0, dtype="int32")
+        self.doc_ids = np.empty(0, dtype="int64")
+        self.doc_lens = np.empty(0, dtype="int32")
+        self._offsets = np.zeros(1, dtype="int64")
+        self._avg_len = None
+
+    @property
+    def term_index(self):
+        """{term: term id}, built from the stored vocabulary on first use."""
+        if self._term_index is None:
+            self._term_index = {term: i for i, term in enumerate(self._vocab.tolist())}
+        return self._term_index
+
+    def _reindex(self):
+        # postings of term t are post_*[offsets[t]:offsets[t + 1]]
+        self._offsets = np.searchsorted(self.post_terms, np.arange(len(self.term_index) + 1))
+        self._avg_len = None
+
+    def remove_files(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def update(self, add=(), remove_ids=()):
+        """Indexes the `add` records (dicts with "id" and "text") and drops `remove_ids`."""
+        remove = np.asarray(list(remove_ids) + [c["id"] for c in add], dtype="int64")
+        if len(remove):
+            keep = ~np.isin(self.post_ids, remove)
+            self.post_terms, self.post_ids, self.post_tf = self.post_terms[keep], self.post_ids[keep], self.post_tf[keep]
+            keep = ~np.isin(self.doc_ids, remove)
+            self.doc_ids, self.doc_lens = self.doc_ids[keep], self.doc_lens[keep]
+
+        term_index = self.term_index
+        terms, ids, tfs, doc_ids, doc_lens = [], [], [], [], []
+        for chunk in add:
+            tokens = tokenize(chunk["text"])
+            doc_ids.append(chunk["id"])
+            doc_lens.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term = term_index.get(token)
+                if term is None:
+                    term = term_index[token] = len(term_index)
+                terms.append(term)
+                ids.append(chunk["id"])
+                tfs.append(tf)
+
+        if add:
+            self.post_terms = np.concatenate([self.post_terms, np.array(terms, dtype="int32")])
+            self.post_ids = np.concatenate([self.post_ids, np.array(ids, dtype="int64")])
+            self.post_tf = np.concatenate([self.post_tf, np.array(tfs, dtype="int32")])
+            self.doc_ids = np.concatenate([self.doc_ids, np.array(doc_ids, dtype="int64")])
+            self.doc_lens = np.concatenate([self.doc_lens, np.array(doc_lens, dtype="int32")])
+        order = np.argsort(self.post_terms, kind="stable")
+        self.post_terms, self.post_ids, self.post_tf = self.post_terms[order], self.post_ids[order], self.post_tf[order]
+        order = np.argsort(self.doc_ids, kind="stable")
+        self.doc_ids, self.doc_lens = self.doc_ids[order], self.doc_lens[order]
+        self._reindex()
+
+    def save(self):
+        """Writes every array into a new directory, then swaps it in place of the previous one."""
+        tmp_path, old_path = self.path + ".tmp", self.path + ".old"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        arrays = {
+            "version": np.array(FORMAT_VERSION),
+            "vocab": np.array(list(self.term_index), dtype="str"),  # in term id order
+            "post_terms": self.post_terms, "post_ids": self.post_ids, "post_tf": self.post_tf,
+            "doc_ids": self.doc_ids, "doc_lens": self.doc_lens, "offsets": self._offsets,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        if os.path.exists(self.path):
+            os.replace(self.path, old_path)
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        self.loaded = True
+
+    def search(self, query, top_k):
+        """Returns (chunk ids, BM25 scores) of the best `top_k` chunks for `query`, best first."""
+        term_index = self.term_index
+        terms = {term_index[t] for t in tokenize(query) if t in term_index}
+        if not terms or not len(self.doc_ids):
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        n_docs = len(self.doc_ids)
+        if self._avg_len is None:
+            self._avg_len = float(self.doc_lens.mean())
+        scores = np.zeros(n_docs, dtype="float32")
+        for t in terms:
+            start, stop = self._offsets[t], self._offsets[t + 1]
+            if start == stop:
+                continue
+            idf = np.log(1 + (n_docs - (stop - start) + 0.5) / ((stop - start) + 0.5))
+            docs = np.searchsorted(self.doc_ids, self.post_ids[start:stop])
+            tf = self.post_tf[start:stop]
+            norm = K1 * (1 - B + B * self.doc_lens[docs] / self._avg_len)
+            scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+        top_k = min(top_k, int((scores > 0).sum()))
+        best = np.argpartition(-scores, top_k - 1)[:top_k] if top_k else np.empty(0, dtype="int64")
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return self.doc_ids[best], scores[best]
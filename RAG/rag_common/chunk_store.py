@@ -0,0 +1,122 @@
+import os
+import json
+import mmap
+
+import numpy as np
+
+
+class ChunkStore:
+    """
+    Offset-indexed chunk metadata on disk, so a query only decodes the rows it returns.
+
+    - `<prefix>.bin`: append-only data file, one compact UTF-8 JSON record per chunk.
+    - `<prefix>.idx.npy`: int64 array of (chunk id, offset, length) rows sorted by id,
+      memory-mapped on load.
+
+    Removed chunks just drop out of the index; their bytes are reclaimed by compaction
+    once dead data outweighs live data.
+    """
+
+    def __init__(self, prefix):
+        self.bin_path = prefix + ".bin"
+        self.idx_path = prefix + ".idx.npy"
+        self._data = None
+        self._rows = np.empty((0, 3), dtype="int64")
+        if os.path.exists(self.idx_path):
+            self._rows = np.load(self.idx_path, mmap_mode="r")
+
+    @staticmethod
+    def exists(prefix):
+        return os.path.exists(prefix + ".idx.npy") and os.path.exists(prefix + ".bin")
+
+    def __len__(self):
+        return len(self._rows)
+
+    def ids(self):
+        return np.asarray(self._rows[:, 0])
+
+    def _map(self):
+        if self._data is None and os.path.getsize(self.bin_path):
+            with open(self.bin_path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data
+
+    def get_many(self, ids):
+        """Returns the records for `ids`, in the same order (None for unknown IDs)."""
+        ids = np.asarray(ids, dtype="int64")
+        if not len(self._rows):
+            return [None] * len(ids)
+        stored = self._rows[:, 0]
+        pos = np.minimum(np.searchsorted(stored, ids), len(stored) - 1)
+        data = self._map()
+        records = []
+        for i, p in zip(ids, pos):
+            if stored[p] != i:
+                records.append(None)
+                continue
+            _, offset, length = self._rows[p]
+            records.append(json.loads(data[offset:offset + length]))
+        return records
+
+    def iter_records(self, batch_size=10_000):
+        """Yields every stored record, in ID order."""
+        ids = self.ids()
+        for s in range(0, len(ids), batch_size):
+            yield from self.get_many(ids[s:s + batch_size])
+
+    def update(self, add=(), remove_ids=()):
+        """Appends the `add` records (dicts with an "id" key) and drops `remove_ids`."""
+        self.close()
+        rows = np.array(self._rows)  # copy out of the read-only mmap
+        if len(remove_ids):
+            rows = rows[~np.isin(rows[:, 0], np.asarray(remove_ids, dtype="int64"))]
+
+        if add:
+            new_rows = []
+            with open(self.bin_path, "ab") as f:
+                offset = f.tell()
+                for record in add:
+                    blob = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                    f.write(blob)
+                    new_rows.append((record["id"], offset, len(blob)))
+                    offset += len(blob)
+            new_rows = np.array(new_rows, dtype="int64")
+            # A re-added ID replaces the old row
+            rows = np.vstack([rows[~np.isin(rows[:, 0], new_rows[:, 0])], new_rows])
+
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        if not os.path.exists(self.bin_path):
+            open(self.bin_path, "wb").close()
+        if os.path.getsize(self.bin_path) > 2 * int(rows[:, 2].sum()) + (1 << 20):
+            rows = self._compact(rows)
+        self._save_rows(rows)
+
+    def _compact(self, rows):
+        """Rewrites the data file with live records only."""
+        tmp_path = self.bin_path + ".tmp"
+        new_rows = rows.copy()
+        with open(self.bin_path, "rb") as src, open(tmp_path, "wb") as dst:
+            for r in new_rows:
+                src.seek(r[1])
+                r[1] = dst.tell()
+                dst.write(src.read(r[2]))
+        os.replace(tmp_path, self.bin_path)
+        return new_rows
+
+    def _save_rows(self, rows):
+        tmp_path = self.idx_path + ".tmp.npy"
+        np.save(tmp_path, rows)
+        os.replace(tmp_path, self.idx_path)
+        self._rows = np.load(self.idx_path, mmap_mode="r")
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def remove_files(self):
+        self.close()
+        self._rows = np.empty((0, 3), dtype="int64")
+        for path in (self.bin_path, self.idx_path):
+            if os.path.exists(path):
+                os.remove(path)
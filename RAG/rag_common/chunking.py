@@ -0,0 +1,105 @@
+import re
+import itertools
+from collections import Counter
+
+import tiktoken
+
+HEADING_MAX_CHARS = 80
+EDGE_LINES = 3  # lines at the top/bottom of a page checked for running headers/footers
+BOILERPLATE_MIN_PAGES = 3
+
+
+def _normalize(line: str) -> str:
+    # Page numbers and dates differ from page to page; the rest of a running header doesn't
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def find_boilerplate(pages):
+    """
+    Returns the normalized lines that repeat at the top or bottom of at least half the pages
+    (running headers, footers, page numbers).
+    """
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for lines in pages:
+        edges = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        counts.update({_normalize(line) for line in edges if line.strip()})
+    return {line for line, n in counts.items() if n >= len(pages) / 2}
+
+
+def is_heading(line: str) -> bool:
+    """Heuristic: a short line without closing punctuation that looks like a title or a numbered section."""
+    line = line.strip()
+    if not line or len(line) > HEADING_MAX_CHARS or line[-1] in ".,;:!?)":
+        return False
+    if re.match(r"^(\d+(\.\d+)*|[IVX]+\.|[A-Z]\.)\s+\S", line):
+        return True
+    words = line.split()
+    if len(words) > 8 or not words[0][0].isupper():
+        return False
+    return line.isupper() or all(w[0].isupper() or not w[0].isalpha() or len(w) <= 3 for w in words)
+
+
+class TokenChunker:
+    """
+    Splits page text into chunks of at most `max_tokens` tiktoken tokens, starting a new chunk
+    at headings (once the current one is reasonably full) and never crossing a page boundary.
+    Each chunk keeps its source file and page number.
+    """
+
+    def __init__(self, max_tokens=350, model="gpt-4"):
+        self.max_tokens = max_tokens
+        self.min_tokens = max_tokens // 4
+        self.encoding = tiktoken.encoding_for_model(model)
+
+    def _split_long(self, line, tokens):
+        for s in range(0, len(tokens), self.max_tokens):
+            yield self.encoding.decode(tokens[s:s + self.max_tokens])
+
+    def chunk_page(self, lines, source, page):
+        chunks, current, current_tokens = [], [], 0
+
+        def flush():
+            text = "\n".join(current).strip()
+            if text:
+                chunks.append({"text": text, "source": source, "page": page})
+
+        for line in lines:
+            tokens = self.encoding.encode(line)
+            if len(tokens) > self.max_tokens:
+                flush()
+                current, current_tokens = [], 0
+                chunks.extend(
+                    {"text": piece, "source": source, "page": page} for piece in self._split_long(line, tokens)
+                )
+                continue
+            starts_section = is_heading(line) and current_tokens >= self.min_tokens
+            if starts_section or current_tokens + len(tokens) > self.max_tokens:
+                flush()
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += len(tokens)
+        flush()
+        return chunks
+
+    def chunk_file(self, pages, source):
+        """`pages` is a list of (page_number, text). Returns the file's chunks, deduplicated."""
+        page_lines = [[line for line in text.splitlines() if line.strip()] for _, text in pages]
+        boilerplate = find_boilerplate(page_lines)
+        chunks, seen = [], set()
+        for (page, _), lines in zip(pages, page_lines):
+            lines = [line for line in lines if _normalize(line) not in boilerplate]
+            for chunk in self.chunk_page(lines, source, page):
+                if chunk["text"] not in seen:
+                    seen.add(chunk["text"])
+                    chunks.append(chunk)
+        return chunks
+
+    def chunk_records(self, records):
+        """
+        Streams (source, page_number, text) records (grouped by source, as rag_common.pdf_extract
+        yields them) and yields (source, chunks) once each file is complete.
+        """
+        for source, group in itertools.groupby(records, key=lambda record: record[0]):
+            yield source, self.chunk_file([(page, text) for _, page, text in group], source)
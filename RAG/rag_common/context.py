@@ -0,0 +1,131 @@
+import itertools
+
+import numpy as np
+import tiktoken
+
+
+def mmr(query_vector, vectors, k, lambda_mult=0.7):
+    """
+    Maximal marginal relevance: greedily picks up to `k` of `vectors`, trading similarity to the
+    query (weight lambda_mult) against similarity to what was already picked.
+    Returns the picked row indices, best first.
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if len(vectors) == 0:
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype="float32").ravel()
+    relevance = vectors @ (query / max(np.linalg.norm(query), 1e-12))
+    pairwise = vectors @ vectors.T
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = pairwise[picked[0]].copy()
+    candidates = np.ones(len(vectors), dtype=bool)
+    candidates[picked[0]] = False
+    while len(picked) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~candidates] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        candidates[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return picked
+
+
+def join_overlapping(first, second, min_overlap=10):
+    """Concatenates two consecutive chunks, writing the text they share (the splitter overlap) once."""
+    for size in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + " " + second
+
+
+def merge_adjacent(chunks):
+    """
+    Merges chunks of the same source whose "chunk_id"s are consecutive into one block, removing
+    the overlapping text. Blocks keep the rank of their best chunk.
+    Returns dicts with "text", "source" and "chunk_ids", plus "vector" (the mean of the chunk
+    vectors) when the chunks carry one.
+    """
+    rank = {id(chunk): r for r, chunk in enumerate(chunks)}
+    blocks = []
+    by_source = sorted(chunks, key=lambda c: (c["source"], c["chunk_id"]))
+    for source, group in itertools.groupby(by_source, key=lambda c: c["source"]):
+        run = []
+        for chunk in group:
+            if run and chunk["chunk_id"] != run[-1]["chunk_id"] + 1:
+                blocks.append(_merge_run(run, rank))
+                run = []
+            run.append(chunk)
+        blocks.append(_merge_run(run, rank))
+    blocks.sort(key=lambda b: b["rank"])
+    for b in blocks:
+        del b["rank"]
+    return blocks
+
+
+def _merge_run(run, rank):
+    text = run[0]["text"]
+    for chunk in run[1:]:
+        text = join_overlapping(text, chunk["text"])
+    block = {
+        "text": text,
+        "source": run[0]["source"],
+        "chunk_ids": [c["chunk_id"] for c in run],
+        "rank": min(rank[id(c)] for c in run),
+    }
+    if "vector" in run[0]:
+        block["vector"] = np.mean([c["vector"] for c in run], axis=0)
+    return block
+
+
+class ContextAssembler:
+    """
+    Turns retrieved chunks into prompt context in three steps, printing the tokens each one saves:
+    merging of adjacent overlapping chunks of the same source, MMR reranking of the merged blocks
+    down to `mmr_k`, and greedy packing (in rank order) into a `max_tokens` tiktoken budget.
+    Merging comes first so that neighbouring chunks, which MMR would see as redundant, end up in
+    one block instead of being dropped. MMR uses the "vector" of each hit, read back from the
+    index by the search (rag_common.retrieval, return_vectors=True), so nothing is re-embedded.
+    `render(block)` is how a block appears in the prompt and is what gets counted.
+    """
+
+    def __init__(self, max_tokens=3000, mmr_k=20, lambda_mult=0.7, model="gpt-4",
+                 render=lambda block: block["text"]):
+        self.max_tokens = max_tokens
+        self.mmr_k = mmr_k
+        self.lambda_mult = lambda_mult
+        self.encoding = tiktoken.encoding_for_model(model)
+        self.render = render
+
+    def _tokens(self, blocks):
+        return [len(self.encoding.encode(self.render(b))) for b in blocks]
+
+    def __call__(self, query_vector, chunks):
+        """`chunks` are retrieval hits (dicts with "text", "source", "chunk_id", "vector"), best first."""
+        if not chunks:
+            return []
+        retrieved = sum(self._tokens(chunks))
+
+        merged = merge_adjacent(chunks)
+        after_merge = sum(self._tokens(merged))
+
+        picked = mmr(query_vector, [b["vector"] for b in merged], self.mmr_k, self.lambda_mult)
+        blocks = [merged[i] for i in sorted(picked)]  # back in rank order for packing
+        block_tokens = self._tokens(blocks)
+        after_mmr = sum(block_tokens)
+
+        packed, used = [], 0
+        for block, n in zip(blocks, block_tokens):
+            if used + n > self.max_tokens:
+                continue  # a smaller block further down may still fit
+            packed.append(block)
+            used += n
+
+        print(
+            f"Context: {len(chunks)} chunks, {retrieved} tokens | "
+            f"merged into {len(merged)} blocks (-{retrieved - after_merge}) | "
+            f"MMR kept {len(blocks)} (-{after_merge - after_mmr}) | "
+            f"packed {len(packed)} into {used}/{self.max_tokens} tokens (-{after_mmr - used})"
+        )
+        return packed
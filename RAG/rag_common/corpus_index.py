@@ -0,0 +1,203 @@
+import os
+
+import faiss
+import numpy as np
+
+from rag_common.ann_index import build_index, choose_kind, index_kind, index_precision, supports_removal, evaluate_recall
+from rag_common.chunk_store import ChunkStore
+from rag_common.bm25 import BM25Index
+from rag_common.manifest import Manifest
+
+
+class CorpusIndex:
+    """
+    A FAISS index, its ChunkStore, a BM25 keyword index and the per-file Manifest, kept in sync
+    in one directory. `update` re-indexes only the files whose fingerprint changed; `open` loads
+    everything for querying without reading the index or metadata into RAM.
+    """
+
+    def __init__(self, directory, index_file="index.faiss", meta_prefix="metadata", bm25_file="bm25"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.index_path = os.path.join(directory, index_file)
+        self.bm25_path = os.path.join(directory, bm25_file)
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.meta_prefix = os.path.join(directory, meta_prefix)
+
+    def exists(self):
+        return (
+            os.path.exists(self.index_path)
+            and os.path.exists(self.manifest_path)
+            and ChunkStore.exists(self.meta_prefix)
+        )
+
+    def version(self):
+        """Changes whenever `update` rewrites the index (answers cached against it are then stale)."""
+        stat = os.stat(self.index_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _read_mmap(self):
+        try:
+            return faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:  # index types FAISS can't mmap are read normally
+            return faiss.read_index(self.index_path)
+
+    def open(self):
+        """Returns (index, chunk_store), with the index memory-mapped when FAISS supports it."""
+        return self._read_mmap(), ChunkStore(self.meta_prefix)
+
+    def open_bm25(self):
+        """Returns the BM25 index, or None if it hasn't been built yet (see `update`)."""
+        bm25 = BM25Index(self.bm25_path)
+        return bm25 if bm25.loaded else None
+
+    def update(self, paths, split, embed, kind="auto", precision="fp32", full=False, evaluate=False, settings=None):
+        """
+        Brings the index in line with `paths`.
+        `split(paths)` yields (path, chunks) for each of `paths`, in any order: chunks is a list
+        of dicts (at least a "text" key), or None if the file couldn't be read (it is retried next run).
+        `embed(texts)` returns a float32 array of shape (len(texts), dim); the index stores the
+        vectors at `precision` (fp32, or fp16 / int8 scalar-quantized, see rag_common.ann_index).
+        `settings` describes how chunks and vectors are produced; when it differs from the
+        previous run, everything is rebuilt.
+        Returns a dict of counts describing what changed.
+        """
+        index = None
+        incremental = not full and self.exists()
+        if incremental:
+            index = self._read_mmap()
+            # Indexes from before chunk IDs existed have to be rebuilt once
+            incremental = index_kind(index) != "flat" or isinstance(index, faiss.IndexIDMap2)
+            if incremental and kind not in ("auto", index_kind(index)):
+                print(f"Switching index type from {index_kind(index)} to {kind}: rebuilding.")
+                incremental = False
+            if incremental and index_kind(index) != "ivfpq" and index_precision(index) != precision:
+                print(f"Switching vector precision from {index_precision(index)} to {precision}: rebuilding.")
+                incremental = False
+            if incremental and settings is not None and Manifest(self.manifest_path).settings != settings:
+                print("Chunking or embedding settings changed: rebuilding.")
+                incremental = False
+
+        store = ChunkStore(self.meta_prefix)
+        bm25 = BM25Index(self.bm25_path)
+        if not incremental:
+            for path in (self.manifest_path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            store.remove_files()
+            bm25.remove_files()
+            bm25.clear()
+            index = None
+        # Indexes from before the keyword index existed get one built from their stored chunks
+        bm25_missing = index is not None and not bm25.loaded
+        manifest = Manifest(self.manifest_path)
+        if settings is not None:
+            manifest.settings = settings
+
+        # Find new, changed and deleted files; when there are none, nothing else is loaded
+        changed, removed = manifest.diff(paths)
+        if index is not None and not changed and not removed and not evaluate and not bm25_missing:
+            manifest.save()
+            return {
+                "added_chunks": 0, "changed_files": 0, "removed_chunks": 0, "removed_files": 0,
+                "total_chunks": len(store), "total_files": len(manifest.files),
+            }
+        if index is not None:
+            index = faiss.read_index(self.index_path)  # writable, in-memory copy for the update
+
+        # Drop the chunks of changed and deleted files
+        # (HNSW can't delete vectors, so the index is rebuilt from the remaining chunks instead)
+        stale_ids = manifest.ids_for([path for path, _ in changed] + removed)
+        rebuild = index is None
+        if stale_ids:
+            if supports_removal(index):
+                index.remove_ids(np.array(stale_ids, dtype="int64"))
+            else:
+                rebuild = True
+        for path in removed:
+            manifest.forget(path)
+
+        # Split the new or changed files
+        chunks = []
+        shas = dict(changed)
+        for path, pieces in split(list(shas)):
+            if pieces is None:
+                manifest.forget(path)
+                continue
+            sha = shas[path]
+            piece_ids = manifest.allocate_ids(len(pieces))
+            manifest.record(path, sha, piece_ids)
+            for chunk_id, piece in zip(piece_ids, pieces):
+                chunks.append({"id": chunk_id, **piece})
+
+        # IDs are only persisted with the manifest, so a run interrupted after writing the index
+        # hands the same IDs out again: drop what the index already holds under them, instead of
+        # adding a second vector per ID (the chunk and keyword stores replace re-added IDs themselves)
+        new_ids = np.array([c["id"] for c in chunks], dtype="int64")
+        if index is not None and not rebuild and len(new_ids):
+            if supports_removal(index):
+                index.remove_ids(new_ids)
+            elif np.isin(new_ids, faiss.vector_to_array(index.id_map)).any():
+                rebuild = True
+
+        # With kind="auto" the index type follows the corpus size (as in FaissVectorStore.add_texts):
+        # a corpus that grew past ann_index.FLAT_MAX, or shrank below it, gets rebuilt as the other type
+        if index is not None and not rebuild and kind == "auto":
+            wanted = choose_kind(index.ntotal + len(chunks))
+            if wanted != index_kind(index):
+                print(f"Switching index type from {index_kind(index)} to {wanted} for {index.ntotal + len(chunks)} chunks: rebuilding.")
+                rebuild = True
+
+        # Embed only the new chunks, or every chunk when the index is (re)built:
+        # chunks that were already indexed come straight out of the embedding cache.
+        to_embed = chunks
+        if rebuild or evaluate:
+            stale = set(stale_ids) | set(new_ids.tolist())
+            to_embed = [c for c in store.iter_records() if c["id"] not in stale] + chunks
+        if to_embed:
+            vectors = embed([c["text"] for c in to_embed])
+            ids = np.array([c["id"] for c in to_embed], dtype="int64")
+
+            # Build a fresh index, or add the new chunks to the existing one by ID
+            if rebuild:
+                index = build_index(vectors, ids, kind=kind, precision=precision)
+            elif chunks:
+                new = np.isin(ids, [c["id"] for c in chunks])
+                index.add_with_ids(vectors[new], ids[new])
+
+            if evaluate:
+                evaluate_recall(index, vectors, ids)
+        elif rebuild and index is not None:
+            # Nothing left to index: keeping the old index would serve the deleted vectors
+            index = None
+            os.remove(self.index_path)
+            store.update(remove_ids=stale_ids)
+            bm25.clear()
+            bm25.save()
+
+        # The keyword index follows the same additions and removals as the vector index
+        if rebuild or bm25_missing:
+            stale = set(stale_ids) | set(new_ids.tolist())
+            bm25.clear()
+            bm25.update(add=[c for c in store.iter_records() if c["id"] not in stale] + chunks)
+        else:
+            bm25.update(add=chunks, remove_ids=stale_ids)
+
+        # Save index, metadata, keyword index and manifest (manifest last, so an interrupted run is redone
+        # with the same chunk IDs)
+        if index is not None and (chunks or stale_ids or rebuild):
+            faiss.write_index(index, self.index_path)
+            store.update(add=chunks, remove_ids=stale_ids)
+        if index is not None and (chunks or stale_ids or rebuild or bm25_missing):
+            bm25.save()
+        manifest.save()
+        store.close()
+
+        return {
+            "added_chunks": len(chunks),
+            "changed_files": len(changed),
+            "removed_chunks": len(stale_ids),
+            "removed_files": len(removed),
+            "total_chunks": len(store),
+            "total_files": len(manifest.files),
+        }
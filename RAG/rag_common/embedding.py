@@ -0,0 +1,73 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+# Errors worth retrying: OpenAI rate limits and transient server/network failures.
+RETRYABLE_ERRORS = ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if type(exc).__name__ in RETRYABLE_ERRORS:
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS
+
+
+def _retry_after(exc: Exception):
+    """Returns the server-suggested wait (seconds) from a Retry-After header, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def embed_batch_with_retry(embedder, texts, max_retries=6, base_delay=1.0, max_delay=60.0):
+    """
+    Embeds one batch with `embed_documents`, backing off exponentially (with jitter)
+    on rate limits and transient errors.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embedder.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            delay = _retry_after(e) or min(max_delay, base_delay * 2 ** attempt)
+            delay *= 1 + random.random() * 0.25
+            print(f"Embedding batch failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def embed_in_batches(embedder, texts, batch_size=256, max_workers=4, max_retries=6):
+    """
+    Embeds `texts` in batches of `batch_size`, running up to `max_workers` batches at once.
+    Vectors are written straight into a preallocated (len(texts), dim) float32 array,
+    in the same order as `texts`.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype="float32")
+
+    starts = range(0, len(texts), batch_size)
+    vectors = None
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(embed_batch_with_retry, embedder, texts[s:s + batch_size], max_retries): s
+            for s in starts
+        }
+        for future in as_completed(futures):
+            start = futures[future]
+            batch = np.asarray(future.result(), dtype="float32")
+            if vectors is None:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype="float32")
+            vectors[start:start + len(batch)] = batch
+            done += len(batch)
+            print(f"Embedded {done}/{len(texts)} chunks", end="\r")
+
+    print()
+    return vectors
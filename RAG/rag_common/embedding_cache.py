@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # pdf.py only needs sentence-transformers
+    Embeddings = object
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "RAG_EMBED_CACHE", str(Path(__file__).resolve().parents[1] / ".cache" / "embeddings.sqlite")
+)
+DEFAULT_MAX_MB = int(os.environ.get("RAG_EMBED_CACHE_MB", "1024"))
+SQL_BATCH = 500  # keys per IN (...) lookup
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalizes and collapses whitespace, so trivially different copies share a key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store in SQLite, keyed by (model name, normalized text hash).
+    Vectors are stored as raw float32 bytes; once the store grows past `max_mb`,
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_MAX_MB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._total_bytes = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model, texts):
+        """Returns a list aligned with `texts`: a float32 vector for hits, None for misses."""
+        keys = [cache_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            for s in range(0, len(keys), SQL_BATCH):
+                batch = keys[s:s + SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    self._db.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({marks})", [time.time(), *batch]
+                    )
+            self._db.commit()
+            results = [
+                np.frombuffer(found[k], dtype="float32") if k in found else None for k in keys
+            ]
+            hits = sum(r is not None for r in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = list({
+            key: (key, np.asarray(v, dtype="float32").tobytes(), now)
+            for key, v in ((cache_key(model, t), v) for t, v in zip(texts, vectors))
+        }.values())
+        with self._lock:
+            # Replacing an existing key must not count its bytes twice
+            for s in range(0, len(rows), SQL_BATCH):
+                batch = [r[0] for r in rows[s:s + SQL_BATCH]]
+                marks = ",".join("?" * len(batch))
+                self._total_bytes -= self._db.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchone()[0]
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._total_bytes += sum(len(r[1]) for r in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Deletes least recently used entries until the store is back under 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._db.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self._db.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_mb": round(self._total_bytes / 1024 / 1024, 2),
+        }
+
+    def __str__(self):
+        s = self.stats()
+        return (
+            f"Embedding cache: {s['hits']} hits, {s['misses']} misses "
+            f"({s['hit_rate']:.0%} hit rate), {s['size_mb']} MB on disk"
+        )
+
+
+def _model_name(embedder):
+    return getattr(embedder, "model", None) or getattr(embedder, "model_name", None) or type(embedder).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps a LangChain embedder (embed_documents / embed_query) with an EmbeddingCache."""
+
+    def __init__(self, embedder, model_name=None, cache=None):
+        self.embedder = embedder
+        self.model_name = model_name or _model_name(embedder)
+        self.cache = cache or EmbeddingCache()
+
+    def embed_documents(self, texts):
+        cached = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            fresh = self.embedder.embed_documents([texts[i] for i in missing])
+            self.cache.put_many(self.model_name, [texts[i] for i in missing], fresh)
+            for i, v in zip(missing, fresh):
+                cached[i] = v
+        return [np.asarray(v, dtype="float32").tolist() for v in cached]
+
+    def embed_query(self, text):
+        vector = self.cache.get_many(self.model_name, [text])[0]
+        if vector is None:
+            vector = self.embedder.embed_query(text)
+            self.cache.put_many(self.model_name, [text], [vector])
+        return np.asarray(vector, dtype="float32").tolist()
+
+
+class CachedEncoder:
+    """
+    Wraps a SentenceTransformer with an EmbeddingCache.
+    `encode` takes a list of sentences and returns a float32 numpy array; everything else
+    is forwarded to the wrapped model.
+    """
+
+    def __init__(self, model, model_name, cache=None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+
+    def encode(self, sentences, **kwargs):
+        cached = self.cache.get_many(self.model_name, sentences)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            kwargs["convert_to_numpy"] = True
+            fresh = self.model.encode([sentences[i] for i in missing], **kwargs)
+            self.cache.put_many(self.model_name, [sentences[i] for i in missing], fresh)
+            for i, v in zip(missing, fresh):
+                cached[i] = v
+        if not cached:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype="float32")
+        return np.vstack(cached).astype("float32", copy=False)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
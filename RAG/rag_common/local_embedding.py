@@ -0,0 +1,84 @@
+import os
+import platform
+from pathlib import Path
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+QUANTIZED_DIR = os.environ.get(
+    "RAG_QUANTIZED_MODELS", str(Path(__file__).resolve().parents[1] / ".cache" / "quantized")
+)
+
+
+def quantization_config() -> str:
+    """The ONNX Runtime dynamic-quantization target matching this CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+def _int8_file_name(config):
+    # Names used by the sentence-transformers hub exports (avx2 is published as unsigned int8)
+    return "onnx/model_quint8_avx2.onnx" if config == "avx2" else f"onnx/model_qint8_{config}.onnx"
+
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    """Name under which a backend's vectors are cached: int8/ONNX vectors differ slightly from torch ones."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def load_sentence_transformer(model_name: str, backend: str = "torch", threads: int = None):
+    """
+    Loads a SentenceTransformer on CPU with the chosen backend:
+    - "torch": the PyTorch fp32 model (what pdf.py always used);
+    - "onnx": the same weights exported to ONNX Runtime;
+    - "onnx-int8": dynamically int8-quantized ONNX weights for this CPU, downloaded if the
+      model publishes them, otherwise quantized once into QUANTIZED_DIR.
+    `threads` sets torch's / ONNX Runtime's intra-op thread count (default: every core).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    threads = threads or os.cpu_count() or 1
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+        return SentenceTransformer(model_name, device="cpu")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    config = quantization_config()
+    file_name = _int8_file_name(config)
+    try:
+        return SentenceTransformer(
+            model_name, device="cpu", backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name}
+        )
+    except Exception:
+        pass  # this model doesn't publish quantized weights: make them locally
+
+    local_dir = os.path.join(QUANTIZED_DIR, model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        print(f"Quantizing {model_name} to int8 ({config}) into {local_dir}...")
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        model.save(local_dir)
+        export_dynamic_quantized_onnx_model(
+            model, config, local_dir, file_suffix=os.path.basename(file_name)[len("model_"):-len(".onnx")]
+        )
+    return SentenceTransformer(
+        local_dir, device="cpu", backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name}
+    )
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hashes a file's content in blocks so large files are not read in one go."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Per-file record of (mtime, size, content hash) and the chunk IDs each file produced.
+    Lets an indexer skip untouched files and remove the chunks of changed or deleted ones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.next_id = 0
+        self.settings = {}  # whatever produced the chunks/vectors (chunker, model, ...)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.next_id = data.get("next_id", 0)
+            self.settings = data.get("settings", {})
+
+    def diff(self, paths):
+        """
+        Compares `paths` against the manifest.
+        Returns (changed, removed): changed is a list of (path, sha256) for new or modified
+        files, removed is a list of paths that are in the manifest but no longer on disk.
+        Files whose mtime and size are unchanged are not read at all.
+        """
+        changed = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            sha = file_sha256(path)
+            if entry and entry["sha256"] == sha:
+                # Touched but identical: refresh the stat info, keep the chunks.
+                entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+                continue
+            changed.append((path, sha))
+
+        current = set(paths)
+        removed = [path for path in self.files if path not in current]
+        return changed, removed
+
+    def ids_for(self, paths):
+        """Returns every chunk ID currently recorded for `paths`."""
+        return [i for path in paths for i in self.files.get(path, {}).get("ids", [])]
+
+    def allocate_ids(self, count):
+        ids = list(range(self.next_id, self.next_id + count))
+        self.next_id += count
+        return ids
+
+    def record(self, path, sha, ids):
+        stat = os.stat(path)
+        self.files[path] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha, "ids": ids}
+
+    def forget(self, path):
+        self.files.pop(path, None)
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"next_id": self.next_id, "settings": self.settings, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
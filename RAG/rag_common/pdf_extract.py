@@ -0,0 +1,143 @@
+import os
+import math
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # older installs only have the PyPDF2 name
+    from PyPDF2 import PdfReader
+
+PAGES_PER_TASK = 16  # pages extracted by the first task of each file; large files then get wider ranges
+
+
+def _limit_memory(max_mb):
+    """
+    Worker initializer: caps the worker's data segment (heap and private anonymous mappings) so a
+    pathological PDF raises MemoryError. RLIMIT_DATA rather than RLIMIT_AS: the address space also
+    counts shared libraries and reserved-but-unused mappings, which the cap should not include.
+    """
+    try:
+        import resource
+        limit = max_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, AttributeError, ValueError, OSError):
+        pass  # not available on this platform
+
+
+def _extract_range(path, start, stop):
+    """
+    Extracts pages [start, stop) of one PDF (clipped to its length). Runs in a worker process.
+    Also returns the page count, so the parent never has to open the file itself.
+    """
+    began = time.perf_counter()
+    n_pages = None
+    try:
+        reader = PdfReader(path)
+        n_pages = len(reader.pages)
+        stop = min(stop, n_pages)
+        texts = [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+        return path, start, texts, n_pages, time.perf_counter() - began, None
+    except Exception as e:  # includes MemoryError from the worker's memory cap
+        where = f"pages {start + 1}-{stop}" if n_pages is not None else "unreadable"
+        return path, start, [], n_pages, time.perf_counter() - began, f"{where}: {type(e).__name__}: {e}"
+
+
+class ExtractionReport:
+    """Per-file page counts, worker time and errors collected while extracting."""
+
+    def __init__(self):
+        self.files = {}
+
+    def _entry(self, path):
+        return self.files.setdefault(path, {"pages": 0, "seconds": 0.0, "errors": []})
+
+    def failed(self, path):
+        return bool(self.files.get(path, {}).get("errors"))
+
+    def print_summary(self):
+        for path, entry in self.files.items():
+            status = "FAILED " + "; ".join(entry["errors"]) if entry["errors"] else "ok"
+            print(f"  {os.path.basename(path)}: {entry['pages']} pages in {entry['seconds']:.2f}s ({status})")
+
+
+def _ranges(path, n_pages, first, pages_per_task, max_workers):
+    """
+    The page ranges after the first `first` pages, at most `max_workers` of them: every range
+    opens the PDF again, so a large file is split into a few wide ranges, not many small ones.
+    """
+    rest = n_pages - first
+    if rest <= 0:
+        return []
+    span = max(pages_per_task, math.ceil(rest / max_workers))
+    return [(path, start, min(start + span, n_pages)) for start in range(first, n_pages, span)]
+
+
+def iter_pdf_pages(paths, max_workers=None, pages_per_task=PAGES_PER_TASK, max_worker_memory_mb=None, report=None):
+    """
+    Extracts the text of `paths` in a process pool, fanning out across files and across
+    page ranges within large files. Yields (pdf_path, page_number, text) records in file
+    and page order (page numbers start at 1). Failures are recorded in `report` and the
+    affected pages are skipped; they never stop the run.
+
+    Each file starts with one task that reads its page count and its first `pages_per_task`
+    pages; the rest of a larger file is then split across the workers (see _ranges).
+    Workers are spawned, not forked: a forked worker would start with a copy of the parent
+    (embedding model, FAISS index) already counted against `max_worker_memory_mb`.
+    """
+    report = report if report is not None else ExtractionReport()
+    max_workers = max_workers or os.cpu_count() or 1
+    pool_kwargs = {"max_workers": max_workers, "mp_context": multiprocessing.get_context("spawn")}
+    if max_worker_memory_mb:
+        pool_kwargs.update(initializer=_limit_memory, initargs=(max_worker_memory_mb,))
+
+    tasks = ((path, 0, pages_per_task) for path in paths)  # first range of each file
+    pending = deque()  # (task, future, retried), in file and page order
+    pool = ProcessPoolExecutor(**pool_kwargs)
+    try:
+        while True:
+            # Keep a bounded window of tasks in flight, so results don't pile up in memory
+            while len(pending) < max_workers * 2:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending.append((task, pool.submit(_extract_range, *task), False))
+            if not pending:
+                break
+
+            task, future, retried = pending.popleft()
+            try:
+                path, start, texts, n_pages, seconds, error = future.result()
+            except BrokenProcessPool:
+                # A worker died (crash or OOM kill): restart the pool and retry the ranges it took down
+                # once; ranges that had already finished keep their results
+                pool.shutdown(cancel_futures=True)
+                pool = ProcessPoolExecutor(**pool_kwargs)
+                in_flight = [(task, future, retried)] + list(pending)
+                pending.clear()
+                for t, f, r in in_flight:
+                    if f.done() and not f.cancelled() and f.exception() is None:
+                        pending.append((t, f, r))
+                    elif r:
+                        report._entry(t[0])["errors"].append(f"pages {t[1] + 1}-{t[2]}: worker crashed")
+                    else:
+                        pending.append((t, pool.submit(_extract_range, *t), True))
+                continue
+
+            entry = report._entry(path)
+            entry["seconds"] += seconds
+            if start == 0 and n_pages is not None:
+                # the rest of this file goes right after its first range, ahead of the next files
+                ranges = [(t, pool.submit(_extract_range, *t), False) for t in _ranges(path, n_pages, task[2], pages_per_task, max_workers)]
+                pending.extendleft(reversed(ranges))
+            if error:
+                entry["errors"].append(error)
+                continue
+            entry["pages"] += len(texts)
+            for offset, text in enumerate(texts):
+                yield path, start + offset + 1, text
+    finally:
+        pool.shutdown(cancel_futures=True)
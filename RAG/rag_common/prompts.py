@@ -0,0 +1,149 @@
+"""
+Local, versioned prompt registry: prompts/<name>/v<N>.json files read once and cached, so the
+pipelines never fetch prompts at startup. Hub prompts are copied in with an explicit sync:
+
+    python -m rag_common.prompts sync rlm/rag-prompt   # pull from the LangChain hub, save vN+1 if it changed
+    python -m rag_common.prompts list
+    python -m rag_common.prompts show pdf-qa
+
+A prompt file holds {"name", "version", "source", "messages": [[role, template], ...]}; roles are
+"system", "human" and "ai", and templates use {variable} placeholders.
+"""
+import os
+import re
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from functools import lru_cache
+
+PROMPTS_DIR = os.environ.get("RAG_PROMPTS_DIR", str(Path(__file__).resolve().parents[1] / "prompts"))
+OPENAI_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class Prompt:
+    """A versioned chat prompt: (role, template) messages with {variable} placeholders."""
+
+    def __init__(self, name, version, messages, source="local"):
+        self.name = name
+        self.version = version
+        self.messages = [tuple(m) for m in messages]
+        self.source = source
+        self._langchain = None
+
+    @property
+    def input_variables(self):
+        return sorted({v for _, template in self.messages for v in re.findall(r"(?<!\{)\{(\w+)\}(?!\})", template)})
+
+    def format_messages(self, **variables):
+        """OpenAI-style [{"role", "content"}] messages, for openai.Client().chat.completions."""
+        return [{"role": OPENAI_ROLES[role], "content": template.format(**variables)} for role, template in self.messages]
+
+    def to_langchain(self):
+        """The prompt as a LangChain ChatPromptTemplate (built once)."""
+        if self._langchain is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            self._langchain = ChatPromptTemplate.from_messages(self.messages)
+        return self._langchain
+
+    @property
+    def fingerprint(self):
+        """name@version plus a hash of the messages: changes when a saved version is edited in place."""
+        digest = hashlib.sha256(json.dumps(self.messages, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+        return f"{self}:{digest}"
+
+    def to_dict(self):
+        return {"name": self.name, "version": self.version, "source": self.source, "messages": [list(m) for m in self.messages]}
+
+    def __str__(self):
+        return f"{self.name}@{self.version}"
+
+
+def _prompt_dir(name, prompts_dir=PROMPTS_DIR):
+    return os.path.join(prompts_dir, *name.split("/"))
+
+
+def versions(name, prompts_dir=PROMPTS_DIR):
+    """Saved versions of `name`, oldest first."""
+    directory = _prompt_dir(name, prompts_dir)
+    if not os.path.isdir(directory):
+        return []
+    found = [m.group(1) for f in os.listdir(directory) if (m := re.fullmatch(r"v(\d+)\.json", f))]
+    return [f"v{n}" for n in sorted(int(n) for n in found)]
+
+
+@lru_cache(maxsize=None)
+def load_prompt(name, version=None, prompts_dir=PROMPTS_DIR):
+    """Loads `name` at `version` (default: the latest saved version) from the local registry."""
+    available = versions(name, prompts_dir)
+    if not available:
+        raise KeyError(f"No prompt named {name!r} in {prompts_dir} (run `python -m rag_common.prompts sync {name}`?)")
+    version = version or available[-1]
+    if version not in available:
+        raise KeyError(f"Prompt {name!r} has no version {version!r} (available: {', '.join(available)})")
+    with open(os.path.join(_prompt_dir(name, prompts_dir), f"{version}.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return Prompt(name, version, data["messages"], source=data.get("source", "local"))
+
+
+def save_prompt(name, messages, source="local", prompts_dir=PROMPTS_DIR):
+    """
+    Saves `messages` as the next version of `name`, unless they equal the latest version.
+    Returns the (new or unchanged latest) Prompt.
+    """
+    available = versions(name, prompts_dir)
+    messages = [list(m) for m in messages]
+    if available:
+        latest = load_prompt(name, available[-1], prompts_dir)
+        if [list(m) for m in latest.messages] == messages:
+            return latest
+    version = f"v{int(available[-1][1:]) + 1 if available else 1}"
+    prompt = Prompt(name, version, messages, source=source)
+    directory = _prompt_dir(name, prompts_dir)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{version}.json"), "w", encoding="utf-8") as f:
+        json.dump(prompt.to_dict(), f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    load_prompt.cache_clear()
+    return prompt
+
+
+def sync_from_hub(name, prompts_dir=PROMPTS_DIR):
+    """Pulls `name` from the LangChain hub (network) and saves it as a new local version if it changed."""
+    from langchain import hub
+
+    pulled = hub.pull(name)
+    messages = []
+    for message in pulled.messages:
+        role = {"SystemMessagePromptTemplate": "system", "AIMessagePromptTemplate": "ai"}.get(type(message).__name__, "human")
+        messages.append([role, message.prompt.template])
+    return save_prompt(name, messages, source=f"hub:{name}", prompts_dir=prompts_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local prompt registry.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_parser = sub.add_parser("sync", help="Pull prompts from the LangChain hub into the registry.")
+    sync_parser.add_argument("names", nargs="+", help="Hub prompt names, e.g. rlm/rag-prompt.")
+    sub.add_parser("list", help="List the prompts and their versions.")
+    show_parser = sub.add_parser("show", help="Print a prompt.")
+    show_parser.add_argument("name")
+    show_parser.add_argument("--version", help="Default: the latest version.")
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        for name in args.names:
+            before = versions(name)
+            prompt = sync_from_hub(name)
+            status = "unchanged" if before and before[-1] == prompt.version else "saved"
+            print(f"{prompt}: {status}")
+    elif args.command == "list":
+        for root, _, files in sorted(os.walk(PROMPTS_DIR)):
+            if any(re.fullmatch(r"v\d+\.json", f) for f in files):
+                name = os.path.relpath(root, PROMPTS_DIR).replace(os.sep, "/")
+                print(f"{name}: {', '.join(versions(name))}")
+    else:
+        prompt = load_prompt(args.name, args.version)
+        print(f"{prompt} (source: {prompt.source}, variables: {', '.join(prompt.input_variables)})")
+        for role, template in prompt.messages:
+            print(f"\n[{role}]\n{template}")
@@ -0,0 +1,91 @@
+import os
+import sys
+
+import faiss
+import numpy as np
+
+from rag_common.ann_index import reconstruct
+
+RRF_K = 60  # reciprocal rank fusion constant (Cormack et al.)
+
+
+def set_search_threads(n=None):
+    """Lets FAISS use `n` OpenMP threads (default: every core) for batched searches."""
+    faiss.omp_set_num_threads(n or os.cpu_count() or 1)
+
+
+def read_questions(path):
+    """Reads one question per line from `path` ("-" for stdin), skipping blank lines."""
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip()]
+
+
+def with_vectors(index, results):
+    """Adds each hit's stored "vector", read back from the index (for MMR) instead of re-embedding its text."""
+    ids = np.unique([hit["id"] for hits in results for hit in hits]).astype("int64")
+    vectors = dict(zip(ids.tolist(), reconstruct(index, ids)))
+    return [[{**hit, "vector": vectors[hit["id"]]} for hit in hits] for hits in results]
+
+
+def search_batch(index, chunk_store, query_vectors, top_k, return_vectors=False):
+    """
+    Runs a single index.search over an (N, dim) matrix of query vectors.
+    Returns, per query, the list of hit records (each with its "score", the FAISS distance,
+    and its "vector" if `return_vectors`).
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+    if index.ntotal == 0:
+        return [[] for _ in range(len(query_vectors))]
+    distances, ids = index.search(query_vectors, min(top_k, index.ntotal))
+    # One metadata lookup for the whole batch; FAISS pads with -1 when it finds fewer than top_k
+    unique_ids = np.unique(ids[ids != -1])
+    records = dict(zip(unique_ids.tolist(), chunk_store.get_many(unique_ids)))
+    results = []
+    for row_ids, row_distances in zip(ids, distances):
+        hits = []
+        for i, d in zip(row_ids.tolist(), row_distances.tolist()):
+            record = records.get(i)
+            if record is not None:
+                hits.append({**record, "score": d})
+        results.append(hits)
+    return with_vectors(index, results) if return_vectors else results
+
+
+def hybrid_search_batch(index, chunk_store, bm25, queries, query_vectors, top_k, candidates=None, rrf_k=RRF_K,
+                        return_vectors=False):
+    """
+    Vector + BM25 retrieval fused with reciprocal rank fusion: every chunk scores
+    sum(1 / (rrf_k + rank)) over the two rankings, so exact-term matches (names, numbers, IDs)
+    surface even when their embeddings rank them low.
+    Each list contributes its best `candidates` hits (default: 2 * top_k).
+    Falls back to vector-only search when `bm25` is None.
+    Returns, per query, the top_k hit records, each with its fused "score" (and "vector", see search_batch).
+    """
+    if bm25 is None:
+        return search_batch(index, chunk_store, query_vectors, top_k, return_vectors)
+    candidates = candidates or 2 * top_k
+    query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+    vector_ids = np.empty((len(queries), 0), dtype="int64")
+    if index.ntotal:
+        _, vector_ids = index.search(query_vectors, min(candidates, index.ntotal))
+
+    fused_ids = []
+    for query, row in zip(queries, vector_ids):
+        scores = {}
+        keyword_ids, _ = bm25.search(query, candidates)
+        for ranking in (row[row != -1].tolist(), keyword_ids.tolist()):
+            for rank, i in enumerate(ranking):
+                scores[i] = scores.get(i, 0.0) + 1.0 / (rrf_k + rank + 1)
+        fused_ids.append(sorted(scores.items(), key=lambda item: -item[1])[:top_k])
+
+    unique_ids = np.unique([i for fused in fused_ids for i, _ in fused]).astype("int64")
+    records = dict(zip(unique_ids.tolist(), chunk_store.get_many(unique_ids)))
+    results = [
+        [{**records[i], "score": score} for i, score in fused if records.get(i) is not None]
+        for fused in fused_ids
+    ]
+    return with_vectors(index, results) if return_vectors else results
@@ -0,0 +1,222 @@
+import json
+import time
+import asyncio
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8700
+MAX_BODY_BYTES = 1 << 20
+
+
+class MicroBatcher:
+    """
+    Groups query texts that arrive close together into one `embed(texts)` call: a batch is sent
+    once `max_batch` texts are waiting or `max_wait_ms` after the first one arrived.
+    """
+
+    def __init__(self, embed, executor, max_batch=32, max_wait_ms=5):
+        self.embed = embed
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.batched_texts = 0
+        self.largest_batch = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def embed_one(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.batched_texts += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.embed, [text for text, _ in batch])
+                for (_, future), vector in zip(batch, np.asarray(vectors, dtype="float32")):
+                    if not future.done():
+                        future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+class QueryServer:
+    """
+    Resident asyncio HTTP server that keeps a RAG pipeline's models and index warm.
+
+    - POST /query  {"question": "...", "retrieve_only": false} -> the dict returned by
+      `answer(question, query_vector, retrieve_only)`, plus per-stage timings.
+    - GET /stats   request counts, latency percentiles, embedding batch sizes and `stats()`.
+
+    Query embeddings are micro-batched across concurrent requests (`embed(texts)` returns an
+    (N, dim) array); retrieval and generation run in a thread pool of `workers` threads.
+    """
+
+    def __init__(self, embed, answer, stats=None, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 workers=8, max_batch=32, max_wait_ms=5):
+        self.embed = embed
+        self.answer = answer
+        self.extra_stats = stats
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=1000)  # seconds, most recent /query requests
+        self.batcher = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if len(request_line) < 2 or length > MAX_BODY_BYTES:
+                status, payload = 400, {"error": "bad request"}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._route(request_line[0], request_line[1], body)
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+        blob = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(blob)}\r\nConnection: close\r\n\r\n".encode("latin-1") + blob
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        path = path.split("?", 1)[0].rstrip("/")
+        if path == "/query" and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+                question = str(request["question"]).strip()
+            except (ValueError, KeyError):
+                return 400, {"error": 'expected a JSON body like {"question": "..."}'}
+            if not question:
+                return 400, {"error": "empty question"}
+            return await self._query(question, bool(request.get("retrieve_only")))
+        if path == "/stats" and method == "GET":
+            return 200, self.stats()
+        return 404, {"error": f"no route for {method} {path}"}
+
+    async def _query(self, question, retrieve_only):
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            vector = await self.batcher.embed_one(question)
+            embedded = time.perf_counter()
+            result = await loop.run_in_executor(self.executor, self.answer, question, vector, retrieve_only)
+        except Exception as e:
+            self.errors += 1
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.in_flight -= 1
+        end = time.perf_counter()
+        self.latencies.append(end - start)
+        result["timings"] = {
+            "embed_ms": round((embedded - start) * 1000, 1),
+            "answer_ms": round((end - embedded) * 1000, 1),
+            "total_ms": round((end - start) * 1000, 1),
+        }
+        return 200, result
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        batcher = self.batcher
+        stats = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+                "p95": round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None,
+            },
+            "embedding_batches": batcher.batches if batcher else 0,
+            "avg_batch_size": round(batcher.batched_texts / batcher.batches, 2) if batcher and batcher.batches else None,
+            "max_batch_size": batcher.largest_batch if batcher else 0,
+        }
+        if self.extra_stats:
+            stats.update(self.extra_stats())
+        return stats
+
+    async def _serve(self):
+        self.batcher = MicroBatcher(self.embed, self.executor, self.max_batch, self.max_wait_ms)
+        self.batcher.start()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"RAG query server listening on http://{self.host}:{self.port} (POST /query, GET /stats)")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        """Warms the embedding model with one call, then serves until interrupted."""
+        self.embed(["warm-up"])
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            print("\nServer stopped.")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _request(url, data=None, timeout=300):
+    request = urllib.request.Request(
+        url, data=None if data is None else json.dumps(data).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"RAG server error {e.code}: {json.load(e).get('error')}") from None
+
+
+def ask(server_url, question, retrieve_only=False, timeout=300):
+    """Sends one question to a running QueryServer and returns its JSON answer."""
+    return _request(server_url.rstrip("/") + "/query", {"question": question, "retrieve_only": retrieve_only}, timeout)
+
+
+def server_stats(server_url, timeout=10):
+    return _request(server_url.rstrip("/") + "/stats", timeout=timeout)
@@ -0,0 +1,42 @@
+import sys
+import time
+
+
+def stream_tokens(pieces, start=None, out=None):
+    """
+    Prints text pieces as they arrive from a streaming completion.
+    `start` is the perf_counter() time the question was asked (default: now), so the latencies
+    include retrieval. Returns (full_text, {"ttft": seconds, "total": seconds}); ttft is None
+    when nothing was streamed.
+    """
+    out = out or sys.stdout
+    start = time.perf_counter() if start is None else start
+    ttft, parts = None, []
+    for piece in pieces:
+        if not piece:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        parts.append(piece)
+        out.write(piece)
+        out.flush()
+    out.write("\n")
+    return "".join(parts), {"ttft": ttft, "total": time.perf_counter() - start}
+
+
+def format_latency(stats):
+    ttft = "n/a" if stats["ttft"] is None else f"{stats['ttft']:.2f}s"
+    return f"(first token after {ttft}, total {stats['total']:.2f}s)"
+
+
+def openai_deltas(stream):
+    """Text deltas of an openai `chat.completions.create(..., stream=True)` response."""
+    for chunk in stream:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
+
+def message_chunks(chunks):
+    """Text of LangChain message chunks (llm.stream(...))."""
+    for chunk in chunks:
+        yield chunk.content
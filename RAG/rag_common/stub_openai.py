@@ -0,0 +1,129 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, to try the streaming chat loops
+without an API key or network:
+
+    python -m rag_common.stub_openai --port 8765 --delay 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub python pdf/pdf.py
+
+It answers every POST /v1/chat/completions with a canned reply, word by word when the request
+asks for stream=true (server-sent events, like the real API), after `--first-token-delay`.
+Legacy POST /v1/completions (langchain_openai.OpenAI) gets the same reply, unstreamed.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "This is a stub answer streamed from the local chat-completions endpoint."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if not path.endswith("/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.server.config
+        model = body.get("model", "stub")
+        words = config["reply"].split(" ")
+        time.sleep(config["first_token_delay"])
+
+        chat = path.endswith("/chat/completions")
+        if not body.get("stream") or not chat:
+            payload = json.dumps(_completion(model, config["reply"], chat)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(config["delay"])
+            self._event(_chunk(model, {"content": word if i == 0 else " " + word}))
+        self._event(_chunk(model, {}, finish_reason="stop"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _event(self, data):
+        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+
+def _completion(model, text, chat=True):
+    if chat:
+        choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+    else:
+        choice = {"index": 0, "text": text, "logprobs": None, "finish_reason": "stop"}
+    return {
+        "id": "cmpl-stub", "object": "chat.completion" if chat else "text_completion",
+        "created": int(time.time()), "model": model,
+        "choices": [choice],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+    }
+
+
+def _chunk(model, delta, finish_reason=None):
+    return {
+        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class StubServer:
+    """
+    Runs the stub in a background thread (port 0 picks a free port).
+    Use as a context manager; `base_url` goes into OPENAI_BASE_URL or openai.Client(base_url=...).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, reply=DEFAULT_REPLY, delay=0.02, first_token_delay=0.2):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = {"reply": reply, "delay": delay, "first_token_delay": first_token_delay}
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the OpenAI chat-completions endpoint.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between streamed words.")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Seconds before the first word.")
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, reply=args.reply, delay=args.delay, first_token_delay=args.first_token_delay)
+    print(f"Stub chat-completions endpoint on {server.base_url} (Ctrl-C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
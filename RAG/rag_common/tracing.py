@@ -0,0 +1,224 @@
+"""
+Stage-level tracing for the RAG pipelines. Each question becomes one JSON line with the
+time spent in every stage (embedding, search, context assembly, prompt, LLM call), the tokens
+going in and out, and cache hits:
+
+    python apple-notes/query.py --trace trace.jsonl
+    python -m rag_common.tracing summary trace.jsonl     # per-stage latency percentiles
+
+With `--profile FILE` the traced questions also run under cProfile and the stats are dumped to
+FILE on exit (open with `python -m pstats FILE` or snakeviz). For sampling profilers, run the
+script under `py-spy record -o profile.svg -- python ...`: the stages are plain function calls,
+so they show up by name in the flame graph.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import cProfile
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+_current = contextvars.ContextVar("rag_trace", default=None)  # follows LangGraph's worker threads
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+
+def count_tokens(text, model="gpt-4"):
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+class Span:
+    """Attributes of one stage; `set` adds fields to its record."""
+
+    def __init__(self, record):
+        self.record = record
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def tokens(self, tokens_in=None, tokens_out=None, model="gpt-4"):
+        """Counts the tokens of the text going into / coming out of the stage."""
+        if tokens_in is not None:
+            self.record["tokens_in"] = count_tokens(tokens_in, model)
+        if tokens_out is not None:
+            self.record["tokens_out"] = count_tokens(tokens_out, model)
+
+
+class _NullSpan(Span):
+    def __init__(self):
+        super().__init__({})
+
+    def set(self, **fields):
+        pass
+
+    def tokens(self, tokens_in=None, tokens_out=None, model="gpt-4"):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Writes one JSON line per `request` (a question) with its `stage`s to `path`, and profiles
+    the requests when given a `profile` file. A Tracer with neither does nothing, so the
+    pipelines can always call it.
+    Stages outside a request are written as single-stage records.
+    """
+
+    def __init__(self, path=None, pipeline="rag", profile=None):
+        self.path = path
+        self.pipeline = pipeline
+        self.enabled = bool(path or profile)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self.profile_path = profile
+        self._profiler = cProfile.Profile() if profile else None
+        self._profiling = 0
+        atexit.register(self.close)
+
+    @contextmanager
+    def request(self, question, **fields):
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+        record = {"trace_id": uuid.uuid4().hex[:12], "pipeline": self.pipeline, "question": question, "stages": []}
+        record.update(fields)
+        start = time.perf_counter()
+        token = _current.set((record, start))
+        self._profile(True)
+        try:
+            yield Span(record)
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self._profile(False)
+            _current.reset(token)
+            self._write(record)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+        request = _current.get()
+        stage = {"stage": name}
+        stage.update(fields)
+        start = time.perf_counter()
+        if request is not None:
+            request, request_start = request
+            stage["offset_ms"] = round((start - request_start) * 1000, 3)
+        try:
+            yield Span(stage)
+        finally:
+            stage["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            if request is None:
+                self._write({"pipeline": self.pipeline, "stages": [stage], "total_ms": stage["ms"]})
+            else:
+                request["stages"].append(stage)
+
+    def _profile(self, on):
+        if self._profiler is None:
+            return
+        with self._lock:  # cProfile profiles one thread; nested / concurrent requests share the run
+            self._profiling += 1 if on else -1
+            if on and self._profiling == 1:
+                self._profiler.enable()
+            elif not on and self._profiling == 0:
+                self._profiler.disable()
+
+    def _write(self, record):
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        if self._profiler is not None and self.profile_path:
+            self._profiler.dump_stats(self.profile_path)
+            print(f"cProfile stats written to {self.profile_path}", file=sys.stderr)
+            self.profile_path = None
+
+
+NULL_TRACER = Tracer()
+
+
+def read_traces(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def summarize(records):
+    """Per (pipeline, stage): count, latency percentiles in ms, mean tokens and cache hit rate."""
+    by_stage = {}
+    for record in records:
+        rows = record["stages"] + [{"stage": "(total)", "ms": record["total_ms"]}] if "question" in record else record["stages"]
+        for stage in rows:
+            by_stage.setdefault((record.get("pipeline", "rag"), stage["stage"]), []).append(stage)
+
+    summary = []
+    for (pipeline, name), stages in sorted(by_stage.items()):
+        ms = np.array([s["ms"] for s in stages])
+        row = {
+            "pipeline": pipeline, "stage": name, "count": len(stages),
+            "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)), "max": float(ms.max()),
+        }
+        for key in ("tokens_in", "tokens_out"):
+            values = [s[key] for s in stages if key in s]
+            row[key] = float(np.mean(values)) if values else None
+        hits = [s["cache_hit"] for s in stages if "cache_hit" in s]
+        row["hit_rate"] = sum(hits) / len(hits) if hits else None
+        summary.append(row)
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'pipeline':<12} {'stage':<14} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'tok in':>7} {'tok out':>7} {'hits':>5}")
+    for r in summary:
+        tokens_in = f"{r['tokens_in']:.0f}" if r["tokens_in"] is not None else "-"
+        tokens_out = f"{r['tokens_out']:.0f}" if r["tokens_out"] is not None else "-"
+        hits = f"{r['hit_rate']:.0%}" if r["hit_rate"] is not None else "-"
+        print(f"{r['pipeline']:<12} {r['stage']:<14} {r['count']:>6} {r['p50']:>9.1f} {r['p95']:>9.1f} "
+              f"{r['p99']:>9.1f} {r['max']:>9.1f} {tokens_in:>7} {tokens_out:>7} {hits:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize RAG trace files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="Per-stage latency percentiles, tokens and cache hits.")
+    summary_parser.add_argument("paths", nargs="+", help="JSONL trace files written with --trace.")
+    summary_parser.add_argument("--pipeline", help="Only this pipeline's records.")
+    summary_parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    args = parser.parse_args()
+
+    records = [r for r in read_traces(args.paths) if not args.pipeline or r.get("pipeline") == args.pipeline]
+    if not records:
+        sys.exit("No trace records found.")
+    result = summarize(records)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{len(records)} records from {', '.join(os.path.basename(p) for p in args.paths)}\n")
+        print_summary(result)
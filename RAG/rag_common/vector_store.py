@@ -0,0 +1,200 @@
+"""
+Persistent LangChain vector store over a FAISS index, for the pipelines that used InMemoryVectorStore
+(which scores every document in Python and is lost at exit).
+"""
+import os
+import json
+import uuid
+import shutil
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from rag_common.ann_index import build_index, choose_kind, index_kind, reconstruct, set_search_params, DEFAULT_NPROBE
+from rag_common.chunk_store import ChunkStore
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype="float32"))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class FaissVectorStore(VectorStore):
+    """
+    Unit-length vectors in a FAISS index keyed by chunk id: exact (flat) below
+    rag_common.ann_index.FLAT_MAX chunks, IVF above, memory-mapped on open. Scores are cosine
+    similarities (1 - squared L2 distance / 2). Documents live in a ChunkStore, so a query only
+    decodes the rows it returns.
+
+    The index and the document-id mapping (keys.json) are written together in a new version
+    directory, which a single rename of `CURRENT` makes live: a crash leaves the previous version
+    intact. Chunk rows are added before that switch and removed after it, so the chunk store only
+    ever holds extra rows, never misses one the index points to.
+    """
+
+    def __init__(self, embedding, directory, precision="fp32"):
+        os.makedirs(directory, exist_ok=True)
+        self._embedding = embedding
+        self.directory = directory
+        self.precision = precision
+        self._current_path = os.path.join(directory, "CURRENT")
+        self._chunks = ChunkStore(os.path.join(directory, "chunks"))
+        self._keys = None  # {document id: chunk id} and the next free chunk id, loaded on first write
+        self._index = None
+        self._writable = False  # False while the index is memory-mapped read-only
+        self._version = 0
+        if os.path.exists(self._current_path):
+            with open(self._current_path, "r", encoding="utf-8") as f:
+                self._version = int(f.read())
+            try:
+                self._index = faiss.read_index(self._path("index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:  # index types FAISS can't mmap are read normally
+                self._index = faiss.read_index(self._path("index.faiss"))
+            set_search_params(self._index, nprobe=DEFAULT_NPROBE)
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return self._index.ntotal if self._index is not None else 0
+
+    def _path(self, name, version=None):
+        return os.path.join(self.directory, f"v{self._version if version is None else version}", name)
+
+    def _load_keys(self):
+        if self._keys is None:
+            self._keys = {"ids": {}, "next_id": 0}
+            if self._version:
+                with open(self._path("keys.json"), "r", encoding="utf-8") as f:
+                    self._keys = json.load(f)
+        return self._keys
+
+    def _writable_index(self):
+        if self._index is not None and not self._writable:
+            self._index = faiss.read_index(self._path("index.faiss"))  # in-memory copy for the update
+            set_search_params(self._index, nprobe=DEFAULT_NPROBE)
+        self._writable = True
+        return self._index
+
+    def _save(self, index):
+        version = self._version + 1
+        os.makedirs(os.path.join(self.directory, f"v{version}"), exist_ok=True)
+        faiss.write_index(index, self._path("index.faiss", version))
+        with open(self._path("keys.json", version), "w", encoding="utf-8") as f:
+            json.dump(self._keys, f)
+        tmp_path = self._current_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(tmp_path, self._current_path)  # the new version is live
+        shutil.rmtree(os.path.join(self.directory, f"v{self._version}"), ignore_errors=True)
+        self._index, self._version = index, version
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        keys = self._load_keys()
+        replaced = [key for key in ids if key in keys["ids"]]
+        if replaced:  # same id again: the new document replaces the old one
+            self.delete(replaced)
+
+        vectors = _normalize(self._embedding.embed_documents(texts))
+        chunk_ids = np.arange(keys["next_id"], keys["next_id"] + len(texts), dtype="int64")
+        self._chunks.update(add=[
+            {"id": int(cid), "key": key, "text": text, "metadata": meta}
+            for cid, key, text, meta in zip(chunk_ids, ids, texts, metadatas)
+        ])
+
+        index = self._writable_index()
+        kind = choose_kind(len(self) + len(texts))
+        if index is None or index_kind(index) != kind:
+            # first build, or the corpus grew past the size where another index type pays off
+            old_ids = np.array(sorted(keys["ids"].values()), dtype="int64")
+            if len(old_ids):
+                vectors = np.vstack([reconstruct(index, old_ids), vectors])
+            index = build_index(vectors, np.concatenate([old_ids, chunk_ids]), kind=kind, precision=self.precision)
+        else:
+            index.add_with_ids(vectors, chunk_ids)
+        keys["next_id"] += len(texts)
+        keys["ids"].update({key: int(cid) for key, cid in zip(ids, chunk_ids)})
+        self._save(index)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return
+        keys = self._load_keys()
+        chunk_ids = [keys["ids"].pop(key) for key in ids if key in keys["ids"]]
+        if not chunk_ids:
+            return
+        index = self._writable_index()
+        index.remove_ids(np.array(chunk_ids, dtype="int64"))
+        self._save(index)
+        self._chunks.update(remove_ids=chunk_ids)
+
+    def clear(self):
+        """Drops every document (e.g. before re-embedding with another model)."""
+        if os.path.exists(self._current_path):
+            os.remove(self._current_path)
+        for name in os.listdir(self.directory):
+            if name.startswith("v") and name[1:].isdigit():
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        self._chunks.remove_files()
+        self._keys, self._index, self._writable, self._version = None, None, False, 0
+
+    def get_by_ids(self, ids):
+        keys = self._load_keys()
+        chunk_ids = [keys["ids"][key] for key in ids if key in keys["ids"]]
+        return [self._document(record) for record in self._chunks.get_many(chunk_ids) if record is not None]
+
+    @staticmethod
+    def _document(record):
+        return Document(id=record["key"], page_content=record["text"], metadata=record["metadata"])
+
+    def search_batch(self, query_vectors, k=4):
+        """
+        Top-k for several query vectors in one FAISS search.
+        Returns, per query, a list of (Document, cosine similarity), best first.
+        """
+        queries = _normalize(query_vectors)
+        if not len(self):
+            return [[] for _ in queries]
+        distances, found = self._index.search(queries, min(k, len(self)))
+        records = self._chunks.get_many(found.ravel())
+        k = found.shape[1]
+        results = []
+        for q in range(len(queries)):
+            hits = zip(found[q], records[q * k:(q + 1) * k], distances[q])
+            results.append([
+                (self._document(record), float(1 - distance / 2))
+                for chunk_id, record, distance in hits if chunk_id >= 0 and record is not None
+            ])
+        return results
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return self.search_batch([embedding], k)[0]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score  # already a cosine similarity
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=None, **kwargs):
+        if directory is None:
+            raise ValueError("FaissVectorStore needs a `directory` to store the vectors in.")
+        store = cls(embedding, directory)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
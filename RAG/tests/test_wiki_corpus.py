@@ -0,0 +1,82 @@
+import os
+import sys
+import hashlib
+
+import numpy as np
+import pytest
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(RAG_DIR)
+sys.path.append(os.path.join(RAG_DIR, "wikipedia"))
+from wiki_corpus import HTMLCache, fetch_pages, sync_vector_store
+from wiki_fixture import WikiFixture
+
+SETTINGS = {"embedding_model": "fake", "chunk_size": 0, "chunk_overlap": 0}
+
+
+class FakeEmbeddings:
+    """Deterministic vectors derived from the text; counts the texts it embeds."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(8).tolist()
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def html(body, footer="Last edited today"):
+    return f'<html><body><div id="bodyContent"><p>{body}</p></div><footer>{footer}</footer></body></html>'
+
+
+@pytest.fixture
+def wiki():
+    with WikiFixture({"Zidane": html("Zinedine Zidane is a French football manager.")}) as fixture:
+        yield fixture
+
+
+def sync(wiki, tmp_path, embeddings):
+    pages = fetch_pages(["Zidane"], HTMLCache(str(tmp_path / "html")), base_url=wiki.base_url, max_age=0)
+    _, stats = sync_vector_store(pages, str(tmp_path / "store"), embeddings, lambda docs: docs, SETTINGS)
+    return pages, stats
+
+
+def test_unchanged_page_is_revalidated_and_not_reembedded(wiki, tmp_path):
+    embeddings = FakeEmbeddings()
+    pages, stats = sync(wiki, tmp_path, embeddings)
+    assert pages[0].status == "downloaded"
+    assert stats["reembedded"] == 1
+
+    pages, stats = sync(wiki, tmp_path, embeddings)
+    assert pages[0].status == "not modified"
+    assert wiki.requests["Zidane"] == {200: 1, 304: 1}
+    assert stats["reembedded"] == 0
+    assert embeddings.embedded == 1
+
+
+def test_new_revision_with_the_same_text_is_not_reembedded(wiki, tmp_path):
+    embeddings = FakeEmbeddings()
+    sync(wiki, tmp_path, embeddings)
+    wiki.set_page("Zidane", html("Zinedine Zidane is a French football manager.", footer="Last edited tomorrow"))
+
+    pages, stats = sync(wiki, tmp_path, embeddings)
+    assert pages[0].status == "downloaded"  # the HTML changed, the article text did not
+    assert stats["reembedded"] == 0
+    assert embeddings.embedded == 1
+
+
+def test_edited_text_is_reembedded(wiki, tmp_path):
+    embeddings = FakeEmbeddings()
+    sync(wiki, tmp_path, embeddings)
+    wiki.set_page("Zidane", html("Zinedine Zidane is a French football manager and former player."))
+
+    _, stats = sync(wiki, tmp_path, embeddings)
+    assert stats["reembedded"] == 1
+    assert embeddings.embedded == 2
@@ -0,0 +1,294 @@
+"""
+Multi-page Wikipedia corpus for the RAG chat: fetches pages concurrently, keeps their raw HTML
+on disk and revalidates it with conditional GETs (ETag / Last-Modified), so an unchanged page
+costs one 304 response, or no request at all while it is younger than `max_age`.
+Pages can also come from a local dump (JSON lines or a MediaWiki XML export).
+
+`sync_vector_store` keeps the embedded chunks in a FaissVectorStore on disk and re-embeds only
+the pages whose content changed since the last run.
+
+The base URL comes from WIKIPEDIA_BASE_URL (default https://en.wikipedia.org/wiki/), so a local
+mirror or the wiki_fixture server can stand in for Wikipedia.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import bs4
+from langchain_core.documents import Document
+
+from rag_common.vector_store import FaissVectorStore
+
+WIKIPEDIA_BASE_URL = os.environ.get("WIKIPEDIA_BASE_URL", "https://en.wikipedia.org/wiki/")
+DEFAULT_CACHE_DIR = str(Path(__file__).resolve().parents[1] / ".cache" / "wikipedia")
+DEFAULT_MAX_AGE = 3600  # seconds before a cached page is revalidated
+FETCH_WORKERS = 8
+STORE_FORMAT = "faiss-v1"  # layout of the saved vector store (see rag_common.vector_store)
+USER_AGENT = "random-rag/1.0 (Wikipedia Q&A demo; python-urllib)"  # Wikipedia rejects requests without one
+
+
+def normalize_title(title: str) -> str:
+    return title.strip().replace(" ", "_")
+
+
+def page_url(title: str, base_url: str = WIKIPEDIA_BASE_URL) -> str:
+    return base_url.rstrip("/") + "/" + urllib.parse.quote(normalize_title(title))
+
+
+def html_to_text(html: str) -> str:
+    """Main content of a Wikipedia page (the whole document for pages without #bodyContent)."""
+    text = bs4.BeautifulSoup(html, "html.parser", parse_only=bs4.SoupStrainer(id="bodyContent")).get_text()
+    return text if text.strip() else bs4.BeautifulSoup(html, "html.parser").get_text()
+
+
+class Page:
+    """
+    One corpus page. `sha256` fingerprints the extracted text, not the raw HTML, so edits to the
+    chrome around the article (navigation, footers, revision ids) don't cause a re-embedding.
+    The fetcher stores it next to the cached HTML: pages that didn't change aren't parsed again.
+    """
+
+    def __init__(self, title, url, content, status, is_html=True, sha256=None):
+        self.title = title
+        self.url = url
+        self.status = status  # downloaded / not modified / cached / stale / dump
+        self._content = content
+        self._is_html = is_html
+        self._text = None
+        self._sha256 = sha256
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+        return self._sha256
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = html_to_text(self._content) if self._is_html else self._content
+        return self._text
+
+    def to_document(self):
+        return Document(page_content=self.text, metadata={"source": self.url, "title": self.title})
+
+
+class HTMLCache:
+    """Raw HTML of fetched pages, one file per page, with the validators needed to revalidate it."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def _path(self, title, suffix):
+        slug = re.sub(r"[^\w.-]", "_", title)[:80]
+        digest = hashlib.sha1(title.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.directory, f"{slug}-{digest}{suffix}")
+
+    def get(self, title):
+        """Returns (meta, html), or (None, None) if the page was never fetched."""
+        meta_path, html_path = self._path(title, ".json"), self._path(title, ".html")
+        if not (os.path.exists(meta_path) and os.path.exists(html_path)):
+            return None, None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(html_path, "r", encoding="utf-8") as f:
+            return meta, f.read()
+
+    def put(self, title, meta, html=None):
+        """Stores the validators in `meta`, and the page itself when `html` is given."""
+        if html is not None:
+            _write_atomic(self._path(title, ".html"), html)
+        _write_atomic(self._path(title, ".json"), json.dumps(meta))
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def fetch_page(title, cache, base_url=WIKIPEDIA_BASE_URL, max_age=DEFAULT_MAX_AGE, timeout=30):
+    """
+    Returns the Page for `title`: from the cache while it is fresh, otherwise revalidated
+    with a conditional GET. If Wikipedia can't be reached, a cached copy is used anyway.
+    Returns None when the page can't be fetched and was never cached.
+    """
+    title = normalize_title(title)
+    url = page_url(title, base_url)
+    meta, html = cache.get(title)
+    if meta is not None and meta["url"] != url:  # fetched from another mirror
+        meta = html = None
+    if meta is not None and time.time() - meta["checked"] < max_age:
+        return _cached_page(title, url, meta, html, "cached", cache)
+
+    headers = {"User-Agent": USER_AGENT}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+            body = response.read().decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+            new_meta = {
+                "url": url, "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"), "checked": time.time(),
+            }
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and meta is not None:
+            meta["checked"] = time.time()
+            return _cached_page(title, url, meta, html, "not modified", cache, save=True)
+        return _fallback(title, url, meta, html, f"HTTP {e.code}")
+    except (urllib.error.URLError, OSError) as e:
+        return _fallback(title, url, meta, html, getattr(e, "reason", e))
+
+    page = Page(title, url, body, "downloaded")
+    new_meta["sha256"] = page.sha256
+    cache.put(title, new_meta, body)
+    return page
+
+
+def _cached_page(title, url, meta, html, status, cache, save=False):
+    """Page for the cached HTML, with the text hash stored in `meta` (computed once for older caches)."""
+    page = Page(title, url, html, status, sha256=meta.get("sha256"))
+    if "sha256" not in meta:
+        meta["sha256"] = page.sha256
+        save = True
+    if save:
+        cache.put(title, meta)
+    return page
+
+
+def _fallback(title, url, meta, html, error):
+    if meta is None:
+        print(f"✗ Could not fetch {url}: {error}")
+        return None
+    print(f"⚠️ Could not revalidate {url} ({error}): using the cached copy.")
+    return Page(title, url, html, "stale", sha256=meta.get("sha256"))
+
+
+def fetch_pages(titles, cache=None, base_url=WIKIPEDIA_BASE_URL, max_age=DEFAULT_MAX_AGE, workers=FETCH_WORKERS):
+    """Fetches `titles` concurrently (see fetch_page). Returns the Pages that could be loaded, in order."""
+    cache = cache or HTMLCache()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(lambda t: fetch_page(t, cache, base_url, max_age), titles))
+    pages = [p for p in pages if p is not None]
+    counts = {}
+    for page in pages:
+        counts[page.status] = counts.get(page.status, 0) + 1
+    print(f"Loaded {len(pages)}/{len(titles)} pages ({', '.join(f'{n} {s}' for s, n in counts.items()) or 'none'}).")
+    return pages
+
+
+def strip_wikitext(text: str) -> str:
+    """Rough plain text of wikitext: templates, tables, references and markup removed."""
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    text = re.sub(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", "", text, flags=re.S)
+    previous = None
+    while previous != text:  # innermost templates / tables first
+        previous = text
+        text = re.sub(r"\{\{[^{}]*\}\}", "", text)
+        text = re.sub(r"\{\|[^{}]*?\|\}", "", text, flags=re.S)
+    text = re.sub(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", "", text)
+    text = re.sub(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]", r"\1", text)
+    text = re.sub(r"\[https?://\S+\s*([^\]]*)\]", r"\1", text)
+    text = re.sub(r"'{2,}", "", text)
+    text = re.sub(r"^=+\s*(.*?)\s*=+\s*$", r"\1", text, flags=re.M)
+    text = re.sub(r"<[^>]+>", "", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def read_dump(path, base_url=WIKIPEDIA_BASE_URL):
+    """
+    Reads pages from a local dump instead of the network:
+    - `.jsonl`: one {"title", "html" or "text", optional "url"} object per line;
+    - `.xml`: a MediaWiki export (Special:Export or a pages-articles dump), wikitext stripped to text.
+    """
+    pages = []
+    if path.endswith(".xml"):
+        title = None
+        for _, elem in ET.iterparse(path):
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = normalize_title(elem.text or "")
+            elif tag == "text" and title:
+                pages.append(Page(title, page_url(title, base_url), strip_wikitext(elem.text or ""), "dump", is_html=False))
+            elif tag == "page":
+                elem.clear()  # keep memory flat on large dumps
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                title = normalize_title(record["title"])
+                url = record.get("url") or page_url(title, base_url)
+                is_html = "html" in record
+                pages.append(Page(title, url, record["html"] if is_html else record["text"], "dump", is_html=is_html))
+    print(f"Loaded {len(pages)} pages from {path}.")
+    return pages
+
+
+def sync_vector_store(pages, store_dir, embeddings, split, settings):
+    """
+    Opens the vector store saved in `store_dir` and brings it in line with `pages`: only pages
+    whose content changed are split (`split(documents)`) and embedded again, and pages that
+    left the corpus are removed. `settings` describes how chunks and vectors are produced
+    (models, chunk sizes); when it differs from the saved store, everything is rebuilt.
+    Returns (vector_store, stats).
+    """
+    manifest_path = os.path.join(store_dir, "manifest.json")
+    vector_store = FaissVectorStore(embeddings, store_dir)
+
+    manifest = {"store": STORE_FORMAT, "settings": settings, "pages": {}}
+    saved = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    if saved is not None and saved.get("store") == STORE_FORMAT and saved["settings"] == settings:
+        manifest = saved
+    elif len(vector_store) or saved is not None:
+        print("Embedding or chunking settings changed: rebuilding the vector store.")
+        vector_store.clear()
+
+    known = manifest["pages"]
+    changed = [p for p in pages if known.get(p.title, {}).get("sha256") != p.sha256]
+    current = {p.title for p in pages}
+    removed = [title for title in known if title not in current]
+    stale_ids = [i for title in removed + [p.title for p in changed] for i in known.get(title, {}).get("ids", [])]
+    if stale_ids:
+        vector_store.delete(stale_ids)
+    for title in removed:
+        del known[title]
+
+    chunks = 0
+    if changed:
+        splits = split([p.to_document() for p in changed])
+        ids, counters = [], {}
+        for doc in splits:
+            title = doc.metadata["title"]
+            counters[title] = counters.get(title, 0) + 1
+            ids.append(f"{title}#{counters[title]}")
+        vector_store.add_documents(splits, ids=ids)
+        chunks = len(splits)
+        for page in changed:
+            page_ids = [f"{page.title}#{n}" for n in range(1, counters.get(page.title, 0) + 1)]
+            known[page.title] = {"sha256": page.sha256, "url": page.url, "ids": page_ids}
+
+    if changed or removed or manifest is not saved:
+        _write_atomic(manifest_path, json.dumps(manifest))
+
+    stats = {"reembedded": len(changed), "removed": len(removed), "unchanged": len(pages) - len(changed), "chunks": chunks}
+    print(f"Vector store: {stats['reembedded']} pages re-embedded ({chunks} chunks), "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged.")
+    return vector_store, stats
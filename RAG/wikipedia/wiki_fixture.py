@@ -0,0 +1,130 @@
+"""
+Local stand-in for Wikipedia's page server, to try the corpus loader without the network:
+
+    python wikipedia/wiki_fixture.py --pages-dir ./my_pages --port 8766
+    WIKIPEDIA_BASE_URL=http://127.0.0.1:8766/wiki/ python wikipedia/wikipedia_Zidane_RAG.py --pages My_Page
+
+GET /wiki/<title> serves <title>.html from the pages, with an ETag and a Last-Modified header,
+and answers 304 Not Modified to matching If-None-Match / If-Modified-Since requests.
+`WikiFixture.set_page` publishes a new revision; `requests` counts the responses per title.
+"""
+import os
+import time
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        fixture = self.server.fixture
+        prefix = "/wiki/"
+        title = urllib.parse.unquote(self.path[len(prefix):]) if self.path.startswith(prefix) else None
+        page = fixture.pages.get(title)
+        if page is None:
+            fixture.count(title, 404)
+            self.send_error(404)
+            return
+        html, etag, modified = page
+
+        if fixture.delay:
+            time.sleep(fixture.delay)
+        if self._not_modified(etag, modified):
+            fixture.count(title, 304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        fixture.count(title, 200)
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(modified, usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag, modified):
+        if self.headers.get("If-None-Match"):
+            return self.headers["If-None-Match"] == etag
+        if self.headers.get("If-Modified-Since"):
+            try:
+                return parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp() >= int(modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class WikiFixture:
+    """
+    Serves `pages` ({title: html}) in a background thread (port 0 picks a free port).
+    Use as a context manager; `base_url` goes into WIKIPEDIA_BASE_URL or fetch_pages(base_url=...).
+    """
+
+    def __init__(self, pages=None, host="127.0.0.1", port=0, delay=0.0):
+        self.pages = {}
+        self.requests = {}  # title -> {status: count}
+        self.delay = delay
+        self._lock = threading.Lock()
+        for title, html in (pages or {}).items():
+            self.set_page(title, html)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fixture = self
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/wiki/"
+        self._thread = None
+
+    def set_page(self, title, html):
+        """Publishes (a new revision of) a page."""
+        etag = '"' + hashlib.sha256(html.encode("utf-8")).hexdigest()[:16] + '"'
+        self.pages[title.strip().replace(" ", "_")] = (html, etag, time.time())
+
+    def count(self, title, status):
+        with self._lock:
+            counts = self.requests.setdefault(title, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for Wikipedia pages.")
+    parser.add_argument("--pages-dir", required=True, help="Directory of <title>.html files to serve.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before each response.")
+    args = parser.parse_args()
+
+    pages = {}
+    for name in sorted(os.listdir(args.pages_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(args.pages_dir, name), "r", encoding="utf-8") as f:
+                pages[name[:-len(".html")]] = f.read()
+    fixture = WikiFixture(pages, port=args.port, delay=args.delay)
+    print(f"Serving {len(pages)} pages on {fixture.base_url} (Ctrl-C to stop)")
+    try:
+        fixture.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fixture.stop()
@@ -1,77 +1,76 @@
 # ==========================================
 # RAG SYSTEM FOR WIKIPEDIA Q&A
-# Scrapes Wikipedia's "Zidane" page and allows users to ask questions.
+# Scrapes Wikipedia's "Zidane" page (or any list of pages) and allows users to ask questions.
 # ==========================================
 # SOURCES:
 # MAIN GUIDE: https://python.langchain.com/docs/tutorials/rag/
 # ==========================================
 
 import os
+import sys
+import time
 import getpass
-import bs4
+import argparse
+import hashlib
 from typing_extensions import List, TypedDict
 
 # LangChain Imports
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.vectorstores import InMemoryVectorStore
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langgraph.graph import START, StateGraph
-from langchain import hub
 from langchain_core.documents import Document
 
-# ==========================================
-# SETTING UP OPENAI API KEY
-# ==========================================
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.streaming import stream_tokens, format_latency
+from rag_common.answer_cache import AnswerCache
+from rag_common.tracing import NULL_TRACER, Tracer
+from rag_common.vector_store import FaissVectorStore
+from rag_common.prompts import load_prompt
+from wiki_corpus import WIKIPEDIA_BASE_URL, DEFAULT_MAX_AGE, fetch_pages, read_dump, sync_vector_store
 
-if not os.environ.get("OPENAI_API_KEY"):
-    os.environ["OPENAI_API_KEY"] = getpass.getpass("Enter API key for OpenAI: ")
+DEFAULT_PAGES = ["Zinedine_Zidane"]
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wiki_index")
+EMBEDDING_MODEL = "text-embedding-3-large"
+CHAT_MODEL = "gpt-4o-mini"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
 
 # ==========================================
-# MODELS INITIALIZATION
+# SETTING UP OPENAI API KEY
 # ==========================================
 
-# Load OpenAI chat model
-llm = ChatOpenAI(model="gpt-4o-mini")
-
-# Load OpenAI embeddings for vector storage
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-
-# Initialize in-memory vector store
-vector_store = InMemoryVectorStore(embeddings)
+def set_openai_key():
+    if not os.environ.get("OPENAI_API_KEY"):
+        os.environ["OPENAI_API_KEY"] = getpass.getpass("Enter API key for OpenAI: ")
 
 # ==========================================
-# SCRAPE WIKIPEDIA (ZIDANE PAGE)
+# LOAD WIKIPEDIA PAGES (CACHED, REVALIDATED)
 # ==========================================
 
-print("Scraping Wikipedia's Zidane page...")
-
-loader = WebBaseLoader(
-    web_paths=("https://en.wikipedia.org/wiki/Zinedine_Zidane",),
-    bs_kwargs=dict(parse_only=bs4.SoupStrainer(id="bodyContent"))  # We will extract the main content only
-)
-
-docs = loader.load()
+def load_pages(titles=DEFAULT_PAGES, dump=None, base_url=WIKIPEDIA_BASE_URL, max_age=DEFAULT_MAX_AGE):
+    """Pages from a local dump, or fetched concurrently with their raw HTML cached on disk."""
+    if dump:
+        return read_dump(dump, base_url=base_url)
+    print(f"Loading {len(titles)} Wikipedia page(s) from {base_url}...")
+    return fetch_pages(titles, base_url=base_url, max_age=max_age)
 
 # ==========================================
 # TEXT CHUNKING & INDEXING
 # ==========================================
 
-print("Splitting text into chunks...")
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-all_splits = text_splitter.split_documents(docs)
-
-print(f"Indexed {len(all_splits)} document chunks.")
-
-# Add chunks to vector store
-vector_store.add_documents(documents=all_splits)
-
-# ==========================================
-# PROMPT SETUP FOR Q&A
-# ==========================================
+def split_documents(docs):
+    print("Splitting text into chunks...")
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_documents(docs)
 
-prompt = hub.pull("rlm/rag-prompt")
+def build_vector_store(splits, embeddings, directory=STORE_DIR):
+    """Embeds the chunks into a fresh vector store saved in `directory` (see wiki_corpus.sync_vector_store for updates)."""
+    vector_store = FaissVectorStore(embeddings, directory)
+    vector_store.clear()
+    vector_store.add_documents(documents=splits)
+    print(f"Indexed {len(splits)} document chunks.")
+    return vector_store
 
 # ==========================================
 # APPLICATION STATE
@@ -83,50 +82,138 @@ class State(TypedDict):
     answer: str
 
 # ==========================================
-# RETRIEVAL FUNCTION
+# BUILD & COMPILE EXECUTION GRAPH
 # ==========================================
 
-def retrieve(state: State):
+def build_graph(vector_store, llm, prompt, k=4, tracer=NULL_TRACER):
     """
-    Retrieves relevant documents from the vector store based on the question.
-    If the context does not contain the answer, simply respond: "I don't know based on the provided corpus."
+    Compiles the retrieve -> generate graph over `vector_store`, answering with `llm` and `prompt`.
+    Each node reports its stages (embed, search, prompt, llm) to `tracer`.
     """
-    retrieved_docs = vector_store.similarity_search(state["question"])
-    return {"context": retrieved_docs}
-
-# ==========================================
-# RESPONSE GENERATION FUNCTION
-# ==========================================
 
-def generate(state: State):
-    """Generates an answer using the retrieved context."""
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-    messages = prompt.invoke({"question": state["question"], "context": docs_content})
-    response = llm.invoke(messages)
-    return {"answer": response.content}
-
-# ==========================================
-# BUILD & COMPILE EXECUTION GRAPH
-# ==========================================
+    def retrieve(state: State):
+        """
+        Retrieves relevant documents from the vector store based on the question.
+        If the context does not contain the answer, simply respond: "I don't know based on the provided corpus."
+        """
+        with tracer.stage("embed", queries=1):
+            q_vec = vector_store.embeddings.embed_query(state["question"])
+        with tracer.stage("search", top_k=k):
+            retrieved_docs = vector_store.similarity_search_by_vector(q_vec, k=k)
+        return {"context": retrieved_docs}
+
+    def generate(state: State):
+        """Generates an answer using the retrieved context."""
+        with tracer.stage("prompt", chunks=len(state["context"])):
+            docs_content = "\n\n".join(doc.page_content for doc in state["context"])
+            messages = prompt.invoke({"question": state["question"], "context": docs_content})
+        with tracer.stage("llm") as span:
+            response = llm.invoke(messages)
+            span.tokens(tokens_in=messages.to_string(), tokens_out=response.content)
+        return {"answer": response.content}
+
+    graph_builder = StateGraph(State).add_sequence([retrieve, generate])
+    graph_builder.add_edge(START, "retrieve")
+    return graph_builder.compile()
+
+def stream_generation(graph, question: str, final_state: dict):
+    """
+    Runs the graph, yielding the answer tokens of the generate node as the LLM produces them.
+    The graph's final state (context and answer) is copied into `final_state`.
+    """
+    for mode, payload in graph.stream({"question": question}, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state.update(payload)
+            continue
+        message, metadata = payload
+        if metadata.get("langgraph_node") == "generate":
+            yield message.content
 
-graph_builder = StateGraph(State).add_sequence([retrieve, generate])
-graph_builder.add_edge(START, "retrieve")
-graph = graph_builder.compile()
+def remember(answer_cache, question: str, q_vec, state: dict):
+    if answer_cache is not None:
+        sources = [{"source": doc.metadata.get("source"), "text": doc.page_content} for doc in state["context"]]
+        answer_cache.put(question, q_vec, state["answer"], sources)
 
 # ==========================================
 # ASK A QUESTION & GET AN ANSWER
 # ==========================================
 
-print("\n Give us your question! I am stronger if we talk about Zidane ⚽️.")
-
-while True:
-    question = input("\n Your question: ").strip()
-
-    if question.lower() == "exit": # Exit condition
-        print("Thanks for using us!")
-        break
-
-    # Get response from the RAG system
-    response = graph.invoke({"question": question})
-
-    print(f"Answer: {response['answer']}")
+def main():
+    parser = argparse.ArgumentParser(description="Ask questions about Zinedine Zidane's Wikipedia page.")
+    parser.add_argument("--pages", nargs="+", default=DEFAULT_PAGES, help="Wikipedia page titles to load.")
+    parser.add_argument("--dump", metavar="FILE", help="Load the pages from a local dump (.jsonl or MediaWiki .xml) instead.")
+    parser.add_argument("--base-url", default=WIKIPEDIA_BASE_URL, help="Wikipedia (or mirror) page URL prefix.")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE, help="Seconds before cached pages are revalidated.")
+    parser.add_argument("--no-stream", action="store_true", help="Print each answer only once it is complete.")
+    parser.add_argument("--no-cache", action="store_true", help="Don't reuse answers to similar earlier questions.")
+    parser.add_argument("--trace", metavar="FILE", help="Append per-stage timings of every question to FILE (JSON lines).")
+    parser.add_argument("--profile", metavar="FILE", help="Run questions under cProfile and dump the stats to FILE on exit.")
+    args = parser.parse_args()
+
+    set_openai_key()
+
+    # Load OpenAI chat model, and embeddings cached on disk (so a restart doesn't re-embed the page)
+    llm = ChatOpenAI(model=CHAT_MODEL)
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+
+    # Only pages revised since the last run are split and embedded again; the rest comes from disk
+    pages = load_pages(args.pages, dump=args.dump, base_url=args.base_url, max_age=args.max_age)
+    if not pages:
+        sys.exit("No pages could be loaded.")
+    settings = {"embedding_model": EMBEDDING_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    vector_store, _ = sync_vector_store(pages, STORE_DIR, embeddings, split_documents, settings)
+    print(embeddings.cache)
+
+    # Cached answers stay valid as long as the indexed pages (and the models and prompt) are the same
+    corpus_version = hashlib.sha256(
+        "\0".join([EMBEDDING_MODEL, CHAT_MODEL, load_prompt("rlm/rag-prompt").fingerprint] + sorted(f"{p.title}:{p.sha256}" for p in pages)).encode("utf-8")
+    ).hexdigest()
+    answer_cache = None if args.no_cache else AnswerCache("wikipedia-zidane", corpus_version)
+
+    # Prompt setup for Q&A: local copy of the hub's rlm/rag-prompt (refresh with `python -m rag_common.prompts sync`)
+    prompt = load_prompt("rlm/rag-prompt").to_langchain()
+    tracer = Tracer(args.trace, pipeline="wikipedia", profile=args.profile)
+    graph = build_graph(vector_store, llm, prompt, tracer=tracer)
+
+    print("\n Give us your question! I am stronger if we talk about Zidane ⚽️.")
+
+    while True:
+        question = input("\n Your question: ").strip()
+
+        if question.lower() == "exit": # Exit condition
+            if answer_cache is not None:
+                print(answer_cache)
+            print("Thanks for using us!")
+            break
+
+        with tracer.request(question) as request:
+            # Answer straight from the cache if a near-identical question was asked before
+            start = time.perf_counter()
+            q_vec, hit = None, None
+            if answer_cache is not None:
+                with tracer.stage("answer_cache") as span:
+                    q_vec = embeddings.embed_query(question)
+                    hit = answer_cache.lookup(q_vec, question)
+                    span.set(cache_hit=hit is not None)
+            if hit:
+                print(f"Answer: {hit['answer']}")
+                print(f"(cached answer to \"{hit['question']}\", similarity {hit['similarity']:.2f}, "
+                      f"{time.perf_counter() - start:.2f}s)")
+                continue
+
+            # Get response from the RAG system
+            if args.no_stream:
+                response = graph.invoke({"question": question})
+                print(f"Answer: {response['answer']}")
+                remember(answer_cache, question, q_vec, response)
+                continue
+
+            final_state = {}
+            print("Answer: ", end="", flush=True)
+            _, stats = stream_tokens(stream_generation(graph, question, final_state), start=start)
+            request.set(ttft_ms=round(stats["ttft"] * 1000, 3) if stats["ttft"] is not None else None)
+            print(format_latency(stats))
+            remember(answer_cache, question, q_vec, final_state)
+
+if __name__ == "__main__":
+    main()
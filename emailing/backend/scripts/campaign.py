@@ -0,0 +1,110 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from smtp_pool import TokenBucket
+
+######################################################################
+# CAMPAIGN RUNNER
+######################################################################
+# Sends a campaign with a bounded pool of asyncio workers. Each recipient domain has its own
+# concurrency cap (and optionally its own rate), and a global token bucket keeps the whole
+# campaign under the provider's quota. The blocking SMTP sends run in a thread pool.
+
+def recipient_domain(email):
+    return email.rsplit("@", 1)[-1].strip().lower()
+
+
+async def _throttle(bucket):
+    wait = bucket.reserve()
+    if wait:
+        await asyncio.sleep(wait)
+
+
+class Campaign:
+    """
+    `send(job)` sends one email (blocking) and returns True or an error message; jobs are dicts
+    with at least an "email" key. Progress comes out as (event, job, error) tuples, with
+    event in "preparing", "sent", "failed".
+    """
+
+    def __init__(self, send, workers=4, rate=0.5, burst=1, domain_concurrency=2, domain_rate=None, domain_burst=1):
+        self.send = send
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.domain_concurrency = domain_concurrency
+        self.domain_rate = domain_rate
+        self.domain_burst = domain_burst
+        self.domains = {}  # domain -> (semaphore, bucket or None)
+        self.stopping = threading.Event()
+
+    def _domain(self, email):
+        domain = recipient_domain(email)
+        if domain not in self.domains:
+            bucket = TokenBucket(self.domain_rate, self.domain_burst) if self.domain_rate else None
+            self.domains[domain] = (asyncio.Semaphore(self.domain_concurrency), bucket)
+        return self.domains[domain]
+
+    async def run(self, jobs, emit):
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue(maxsize=self.workers * 2)  # bounded: large lists aren't queued all at once
+
+        async def produce():
+            for job in jobs:
+                if self.stopping.is_set():
+                    break
+                await pending.put(job)
+            for _ in range(self.workers):
+                await pending.put(None)
+
+        async def work(executor):
+            while (job := await pending.get()) is not None:
+                if self.stopping.is_set():
+                    continue  # drain the queue without sending
+                semaphore, domain_bucket = self._domain(job["email"])
+                async with semaphore:
+                    # domain first, so a throttled domain doesn't hold global tokens while it waits
+                    if domain_bucket:
+                        await _throttle(domain_bucket)
+                    if self.bucket:
+                        await _throttle(self.bucket)
+                    if self.stopping.is_set():
+                        continue
+                    emit(("preparing", job, None))
+                    try:
+                        result = await loop.run_in_executor(executor, self.send, job)
+                    except Exception as e:
+                        result = str(e)
+                emit(("sent", job, None) if result is True else ("failed", job, result))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            await asyncio.gather(produce(), *(work(executor) for _ in range(self.workers)))
+
+    def stream(self, jobs):
+        """
+        Runs the campaign on an event loop in a background thread and yields its progress events
+        as they happen, for synchronous callers (the Streamlit generator, the CLI).
+        Closing the generator stops the campaign once the sends in flight are done.
+        """
+        events = queue.Queue()
+        done = object()
+
+        def run():
+            try:
+                asyncio.run(self.run(jobs, events.put))
+            except BaseException as e:
+                events.put(e)
+            finally:
+                events.put(done)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while (event := events.get()) is not done:
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            self.stopping.set()
+            thread.join()
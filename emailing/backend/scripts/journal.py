@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+######################################################################
+# CONFIGURATION
+######################################################################
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+JOURNAL_PATH = os.path.join(PROJECT_ROOT, "backend", "output", "send_journal.sqlite")
+
+######################################################################
+# SEND JOURNAL
+######################################################################
+# One row per (campaign, recipient) with the hash of the template that was sent and the outcome:
+#   sending — handed to the SMTP server, outcome unknown (the run stopped, or the connection dropped, before
+#             the answer): it may have arrived, so it is not sent again unless asked (see `unconfirmed`)
+#   sent    — accepted by the server
+#   failed  — refused or errored; retried on the next run
+# A rerun of the same campaign retries only the failures and the recipients not tried yet.
+
+def template_hash(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_recipient(email):
+    return str(email).strip().lower()
+
+
+class SendJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()  # the campaign records outcomes from its sender threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # durable across app crashes, cheap commits
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sends ("
+            "campaign_id TEXT NOT NULL, recipient TEXT NOT NULL, template_hash TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated REAL NOT NULL, "
+            "PRIMARY KEY (campaign_id, recipient))"
+        )
+        self.db.commit()
+
+    def completed(self, campaign_id):
+        """Recipients this campaign was already sent to."""
+        rows = self.db.execute(
+            "SELECT recipient FROM sends WHERE campaign_id = ? AND status = 'sent'", (campaign_id,)
+        )
+        return {recipient for (recipient,) in rows}
+
+    def unconfirmed(self, campaign_id):
+        """Recipients left as "sending": handed to the server, but with no answer recorded. Check them by hand."""
+        rows = self.db.execute(
+            "SELECT recipient FROM sends WHERE campaign_id = ? AND status = 'sending' ORDER BY recipient", (campaign_id,)
+        )
+        return [recipient for (recipient,) in rows]
+
+    def mark(self, campaign_id, recipient, template, status, error=None):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO sends (campaign_id, recipient, template_hash, status, attempts, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (campaign_id, recipient) DO UPDATE SET template_hash = excluded.template_hash, "
+                "status = excluded.status, attempts = attempts + excluded.attempts, error = excluded.error, "
+                "updated = excluded.updated",
+                (campaign_id, normalize_recipient(recipient), template, status,
+                 1 if status == "sending" else 0, error, time.time()),
+            )
+            self.db.commit()
+
+    def summary(self, campaign_id=None):
+        """{campaign_id: {status: count}}."""
+        query = "SELECT campaign_id, status, COUNT(*) FROM sends"
+        params = ()
+        if campaign_id:
+            query += " WHERE campaign_id = ?"
+            params = (campaign_id,)
+        counts = {}
+        for campaign, status, n in self.db.execute(query + " GROUP BY campaign_id, status", params):
+            counts.setdefault(campaign, {})[status] = n
+        return counts
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show what each campaign has sent so far.")
+    parser.add_argument("--campaign", help="Only this campaign ID.")
+    parser.add_argument("--unconfirmed", action="store_true",
+                        help="List the recipients left as 'sending', which may or may not have received the email.")
+    args = parser.parse_args()
+
+    journal = SendJournal()
+    for campaign, counts in journal.summary(args.campaign).items():
+        print(f"{campaign}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+        if args.unconfirmed:
+            for recipient in journal.unconfirmed(campaign):
+                print(f"  ? {recipient}")
@@ -0,0 +1,69 @@
+import os
+import numpy as np
+
+######################################################################
+# CONFIGURATION
+######################################################################
+# Pragmatic address check: something@domain.tld, no spaces, no double dots in the domain
+EMAIL_PATTERN = r"[a-z0-9!#$%&'*+/=?^_`{|}~.-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}"
+
+######################################################################
+# PRE-FLIGHT
+######################################################################
+# Checks the whole contact list at once, with column operations instead of a Python loop per row,
+# before anything is sent. Each rejected row gets the first reason that applies:
+#   missing email, malformed email, missing <column>, suppressed, duplicate
+
+def normalize_emails(emails):
+    return emails.astype("string").str.strip().str.lower()
+
+
+def load_suppression_list(path):
+    """Addresses that must never be emailed (unsubscribes, bounces): one per line, or first column of a CSV."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.split(",")[0].strip().lower() for line in f if "@" in line}
+
+
+def preflight(df, required_columns, suppressed=frozenset()):
+    """
+    Returns (clean, rejected). `clean` has normalized emails, stripped text in `required_columns`
+    and string dtypes, ready for the sender. `rejected` holds the other rows plus a "reason" column.
+    """
+    df = df.copy()
+    df["email"] = normalize_emails(df["email"])
+    text_columns = [column for column in required_columns if column != "email"]
+    for column in text_columns:
+        df[column] = df[column].astype("string").str.strip()
+
+    def flag(mask):
+        return mask.to_numpy(dtype=bool, na_value=True)
+
+    email = df["email"]
+    checks = [
+        ("missing email", flag(email.isna() | (email == ""))),
+        ("malformed email", ~email.str.fullmatch(EMAIL_PATTERN).to_numpy(dtype=bool, na_value=False)),
+    ]
+    checks += [(f"missing {column}", flag(df[column].isna() | (df[column] == ""))) for column in text_columns]
+    checks.append(("suppressed", email.isin(suppressed).to_numpy(dtype=bool, na_value=False)))
+    valid = ~np.logical_or.reduce([mask for _, mask in checks])
+    # duplicates among the valid rows only: the first valid occurrence is the one that gets the email
+    checks.append(("duplicate", valid & email.where(valid).duplicated().to_numpy(dtype=bool, na_value=False)))
+
+    reason = np.select([mask for _, mask in checks], [name for name, _ in checks], default="")
+    keep = reason == ""
+    rejected = df[~keep].assign(reason=reason[~keep])
+    return df[keep].reset_index(drop=True), rejected
+
+
+def records(df):
+    """Rows as dicts of plain Python values, produced lazily so sending starts right away."""
+    columns = list(df.columns)
+    for values in zip(*(df[column].tolist() for column in columns)):
+        yield dict(zip(columns, values))
+
+
+def summarize_rejections(rejected):
+    """Counts per reason, e.g. "2 malformed email, 1 duplicate"."""
+    return ", ".join(f"{n} {reason}" for reason, n in rejected["reason"].value_counts().items())
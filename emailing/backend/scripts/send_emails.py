@@ -4,8 +4,13 @@ import pandas as pd
 from dotenv import load_dotenv
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import smtplib
-import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # sibling modules, also when imported by main.py
+from smtp_pool import SMTPPool, DeliveryUnknown
+from campaign import Campaign
+from journal import SendJournal, template_hash
+from templates import load_email_template
+from preflight import preflight, load_suppression_list, records, summarize_rejections
 
 ######################################################################
 # CONFIGURATION
@@ -15,10 +20,12 @@ PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
 load_dotenv(os.path.join(PROJECT_ROOT, ".env"))
 
 CONTACT_LIST_PATH = os.path.join(PROJECT_ROOT, "backend", "contact_lists", "contact_list.csv")
-TEMPLATE_FR_PATH = os.path.join(PROJECT_ROOT, "backend", "templates", "template_fr.txt")
-TEMPLATE_EN_PATH = os.path.join(PROJECT_ROOT, "backend", "templates", "template_en.txt")
+SUPPRESSION_LIST_PATH = os.path.join(PROJECT_ROOT, "backend", "contact_lists", "suppression_list.csv")  # never emailed (optional)
+TEMPLATES_DIR = os.path.join(PROJECT_ROOT, "backend", "templates")  # template_<fr|en>.txt + subject_<fr|en>.txt, loaded when used
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, "backend", "output")
 OLD_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "_Old")
+JOURNAL_PATH = os.path.join(OUTPUT_DIR, "send_journal.sqlite")
+REJECTED_PATH = os.path.join(OUTPUT_DIR, "rejected_contacts.csv")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # email configuration — personal logins to fill in the .env file
@@ -26,28 +33,42 @@ SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+SMTP_AUTH = os.getenv("SMTP_AUTH", "true").lower() != "false"  # false only for servers without login (local stub)
 FROM_EMAIL = SMTP_USERNAME
 
-# templates
-with open(TEMPLATE_FR_PATH, "r", encoding="utf-8") as f:
-    template_fr = f.read()
+# sending pace — authenticated connections reused for every email, concurrent workers paced by token buckets
+SMTP_CONNECTIONS = int(os.getenv("SMTP_CONNECTIONS", "1"))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", str(SMTP_CONNECTIONS)))  # more workers than connections only wait
+SEND_RATE = float(os.getenv("SEND_RATE", "0.5"))  # emails per second, i.e. one every 2s (check your provider's limit)
+SEND_BURST = int(os.getenv("SEND_BURST", "1"))
+DOMAIN_CONCURRENCY = int(os.getenv("DOMAIN_CONCURRENCY", "2"))  # emails in flight per recipient domain
+DOMAIN_RATE = float(os.getenv("DOMAIN_RATE", "0")) or None  # emails per second per recipient domain (0: no cap)
+MAX_EMAILS_PER_CONNECTION = int(os.getenv("MAX_EMAILS_PER_CONNECTION", "100"))
 
-with open(TEMPLATE_EN_PATH, "r", encoding="utf-8") as f:
-    template_en = f.read()
+# send journal — a rerun of the same campaign skips whoever already received it
+CAMPAIGN_ID = os.getenv("CAMPAIGN_ID")  # default: language + template hash, so editing the template starts a new campaign
+RETRY_UNCONFIRMED = os.getenv("RETRY_UNCONFIRMED", "false").lower() == "true"  # resend recipients left as "sending"
 
 
 ######################################################################
 # FUNCTIONS
 ######################################################################
-def get_subject(language):
-    return f"blablabla * {'API de Structuration de Données' if language == 'French' else 'Structured Data API'}" # Personalize this with your subject line
-
-def fill_template(template, placeholders):
-    for key, value in placeholders.items():
-        template = template.replace(f"[{key.upper()}]", value)
-    return template
-
-def send_email(to_email, subject, body):
+def create_smtp_pool():
+    return SMTPPool(
+        SMTP_SERVER, SMTP_PORT,
+        username=SMTP_USERNAME if SMTP_AUTH else None, password=SMTP_PASSWORD,
+        size=SMTP_CONNECTIONS, starttls=SMTP_STARTTLS,
+        max_messages_per_connection=MAX_EMAILS_PER_CONNECTION,  # pacing is done by the Campaign
+    )
+
+def create_campaign(send):
+    return Campaign(
+        send, workers=SEND_WORKERS, rate=SEND_RATE, burst=SEND_BURST,
+        domain_concurrency=DOMAIN_CONCURRENCY, domain_rate=DOMAIN_RATE,
+    )
+
+def send_email(to_email, subject, body, pool):
     msg = MIMEMultipart()
     msg["From"] = FROM_EMAIL
     msg["To"] = to_email
@@ -55,11 +76,10 @@ def send_email(to_email, subject, body):
     msg["Bcc"] = FROM_EMAIL # I put me in Bcc to keep track of sent emails
     msg.attach(MIMEText(body, "html"))
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
+        pool.send(msg)
         return True
+    except DeliveryUnknown:
+        raise  # not a plain failure: the caller must not retry it
     except Exception as e:
         return str(e)
 
@@ -73,9 +93,10 @@ def run_from_ui(selected_language=None):
     else:
         language = selected_language
     
+    language_code = language
     language = "French" if language == "fr" else "English"
     
-    df = pd.read_csv(CONTACT_LIST_PATH)
+    df = pd.read_csv(CONTACT_LIST_PATH, dtype=str)  # all text: no float names or phone numbers
     
     required_columns = ['first_name', 'last_name', 'email', 'company'] # Personalize this with your required columns
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -83,27 +104,58 @@ def run_from_ui(selected_language=None):
         yield f"Error: Missing required columns in CSV: {', '.join(missing_columns)}"
         return
 
-    for _, row in df.iterrows():
-        msg = f"...preparing email for {row['first_name']} {row['last_name']} ({row['email']})..."
-        yield msg
-
-        subject = get_subject(language)
-
-        placeholders = {
-            "FIRST_NAME": row["first_name"],
-            "COMPANY": row["company"]
-        }
-
-        template = template_fr if language == "French" else template_en
-        email_body = fill_template(template, placeholders)
+    try:
+        template = load_email_template(language_code, TEMPLATES_DIR)  # subject + body, parsed once
+    except FileNotFoundError as e:
+        yield f"Error: {e}"
+        return
+    missing_placeholders = template.missing(df.columns)
+    if missing_placeholders:
+        yield f"Error: The {language} template uses placeholders with no column in the CSV: {', '.join(missing_placeholders)}"
+        return
 
-        result = send_email(row["email"], subject, email_body)
-        if result is True:
-            yield f"✓ Email sent to {row['email']}"
-        else:
-            yield f"✗ Failed to send email to {row['email']}: {result}"
-        
-        time.sleep(2)
+    # Pre-flight over the whole list: normalized emails, no blank fields, duplicates or suppressed addresses
+    contacts, rejected = preflight(df, list(dict.fromkeys(required_columns + template.columns)),
+                                   load_suppression_list(SUPPRESSION_LIST_PATH))
+    if len(rejected):
+        rejected.to_csv(REJECTED_PATH, index=False)
+        yield f"Pre-flight: {len(contacts)} contacts ready, {len(rejected)} skipped ({summarize_rejections(rejected)}) — see {REJECTED_PATH}"
+
+    version = template_hash(template.subject.source, template.body.source)
+    campaign_id = CAMPAIGN_ID or f"{language.lower()}-{version[:12]}"
+
+    with SendJournal(JOURNAL_PATH) as journal, create_smtp_pool() as pool:
+        # Skip who already got it, and who may have (handed to the server, no answer): resending risks a duplicate
+        unconfirmed = [] if RETRY_UNCONFIRMED else journal.unconfirmed(campaign_id)
+        already_sent = contacts["email"].isin(journal.completed(campaign_id))  # emails are already normalized
+        maybe_sent = contacts["email"].isin(unconfirmed)
+        skip = already_sent | maybe_sent
+        if skip.any():
+            yield (f"↻ Resuming campaign {campaign_id}: {already_sent.sum()} already sent, "
+                   f"{maybe_sent.sum()} unconfirmed, {(~skip).sum()} to go")
+        if maybe_sent.any():
+            yield (f"? Skipped {maybe_sent.sum()} recipients who may already have received it: check them with "
+                   f"`journal.py --unconfirmed`, or set RETRY_UNCONFIRMED=true to resend")
+        contacts = contacts[~skip]
+
+        def send(row):
+            subject, email_body = template.render(row)  # [FIRST_NAME] -> row["first_name"], etc.
+            # Recorded from the sender thread, so the outcome is saved even if nobody reads the progress anymore
+            journal.mark(campaign_id, row["email"], version, "sending")
+            # DeliveryUnknown propagates and leaves the recipient as "sending": it may have arrived
+            result = send_email(row["email"], subject, email_body, pool)
+            journal.mark(campaign_id, row["email"], version, "sent" if result is True else "failed",
+                         None if result is True else result)
+            return result
+
+        # Several emails in flight at once, within the global and per-domain limits
+        for event, row, error in create_campaign(send).stream(records(contacts)):
+            if event == "preparing":
+                yield f"...preparing email for {row['first_name']} {row['last_name']} ({row['email']})..."
+            elif event == "sent":
+                yield f"✓ Email sent to {row['email']}"
+            else:
+                yield f"✗ Failed to send email to {row['email']}: {error}"
 
 if __name__ == "__main__":
     if "--no-confirm" not in sys.argv:
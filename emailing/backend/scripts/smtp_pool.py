@@ -0,0 +1,170 @@
+import time
+import queue
+import smtplib
+import threading
+
+######################################################################
+# RATE LIMITING
+######################################################################
+class TokenBucket:
+    """Allows `rate` sends per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Takes `tokens` now and returns how many seconds the caller must wait before using them."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens  # may go negative: later callers queue up behind this one
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+######################################################################
+# CONNECTION POOL
+######################################################################
+# Errors after which the connection can't be trusted anymore: drop it and send again on a fresh one
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class DeliveryUnknown(smtplib.SMTPException):
+    """The connection was lost after the message was handed over (DATA): it may have been delivered."""
+
+
+class _PooledSMTP(smtplib.SMTP):
+    # Remembers whether the current message got as far as DATA: before that, resending is safe
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+def _quit(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open and reuses them across messages,
+    so STARTTLS and login happen once per connection instead of once per email.
+    A connection the server dropped is replaced and the message sent again (`retries` times).
+    With `rate` (messages per second), sends are paced by a token bucket instead of a fixed sleep.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=1, starttls=True, timeout=30,
+                 rate=None, burst=1, max_messages_per_connection=None, retries=2):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.starttls = starttls
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_messages_per_connection = max_messages_per_connection  # some providers cap messages per session
+        self.retries = retries
+        self.idle = queue.LifoQueue()  # most recently used first: least likely to have timed out
+        # One slot per connection in use. Every checkout takes a slot and every checkin, discard or failed
+        # connect gives it back, so a sender waiting for a connection always wakes up.
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.stats = {"sent": 0, "connections": 0, "reconnects": 0}
+
+    def _connect(self):
+        server = _PooledSMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        server.messages_sent = 0
+        with self.lock:
+            self.stats["connections"] += 1
+        return server
+
+    def _checkout(self):
+        self.slots.acquire()  # wait until fewer than `size` connections are in use
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _checkin(self, server):
+        if self.max_messages_per_connection and server.messages_sent >= self.max_messages_per_connection:
+            self._discard(server)
+            return
+        self.idle.put(server)
+        self.slots.release()
+
+    def _discard(self, server):
+        _quit(server)
+        self.slots.release()
+
+    def send(self, msg):
+        """
+        Sends an email.message.Message, reconnecting if the server dropped the connection before
+        the message was handed over (e.g. a stale idle connection failing on MAIL FROM).
+        A connection lost during DATA raises DeliveryUnknown instead: sending again could duplicate the email.
+        """
+        if self.bucket:
+            self.bucket.acquire()
+        for attempt in range(self.retries + 1):
+            server = self._checkout()
+            server.data_started = False
+            try:
+                server.send_message(msg)
+            except CONNECTION_ERRORS as e:
+                self._discard(server)
+                if server.data_started:
+                    raise DeliveryUnknown(f"connection lost after sending the message, it may have been delivered: {e}") from e
+                if attempt == self.retries:
+                    raise
+                with self.lock:
+                    self.stats["reconnects"] += 1
+                continue
+            except Exception:
+                # The server rejected this message (recipient, content...): the connection itself is fine
+                self._checkin(server)
+                raise
+            server.messages_sent += 1
+            self._checkin(server)
+            with self.lock:
+                self.stats["sent"] += 1
+            return
+
+    def close(self):
+        while True:
+            try:
+                _quit(self.idle.get_nowait())  # idle connections hold no slot
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
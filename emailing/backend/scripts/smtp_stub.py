@@ -0,0 +1,74 @@
+import argparse
+import threading
+
+from aiosmtpd.controller import Controller
+
+######################################################################
+# LOCAL SMTP STAND-IN
+######################################################################
+# Accepts every email and keeps it in memory instead of delivering it, to try the sender
+# without a real mailbox:
+#   python backend/scripts/smtp_stub.py --port 8025
+#   SMTP_SERVER=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false python backend/scripts/send_emails.py
+# (no STARTTLS / login against the stub: leave SMTP_USERNAME as the From address only)
+
+class RecordingHandler:
+    def __init__(self, verbose=False, fail_every=0, disconnect_every=0):
+        self.messages = []
+        self.sessions = set()
+        self.verbose = verbose
+        self.fail_every = fail_every  # e.g. 3: every third message is refused with a 451
+        self.disconnect_every = disconnect_every  # every Nth message is kept but the connection drops before the reply
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.sessions.add(id(session))
+            count = len(self.messages) + 1
+            if self.fail_every and count % self.fail_every == 0:
+                self.messages.append(None)
+                return "451 Requested action aborted: local error in processing"
+            self.messages.append((envelope.mail_from, list(envelope.rcpt_tos)))
+            if self.disconnect_every and count % self.disconnect_every == 0:
+                server.transport.close()
+                return "421 Closing connection"  # never reaches the client
+        if self.verbose:
+            print(f"✉︎ {envelope.mail_from} → {', '.join(envelope.rcpt_tos)} (session {id(session):x})")
+        return "250 Message accepted for delivery"
+
+
+class SMTPStub:
+    """Runs the stand-in in a background thread; `handler.messages` lists (from, recipients) per email."""
+
+    def __init__(self, host="127.0.0.1", port=8025, verbose=False, fail_every=0, disconnect_every=0):
+        self.handler = RecordingHandler(verbose=verbose, fail_every=fail_every, disconnect_every=disconnect_every)
+        self.controller = Controller(self.handler, hostname=host, port=port)
+
+    def start(self):
+        self.controller.start()
+        return self
+
+    def stop(self):
+        self.controller.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP server that accepts and records every email.")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-every", type=int, default=0, help="Refuse every Nth message (to try failure handling).")
+    args = parser.parse_args()
+
+    stub = SMTPStub(port=args.port, verbose=True, fail_every=args.fail_every).start()
+    print(f"Local SMTP stand-in on 127.0.0.1:{args.port} (Enter to stop)")
+    try:
+        input()
+    except (KeyboardInterrupt, EOFError):
+        pass
+    stub.stop()
+    print(f"{len(stub.handler.messages)} emails received over {len(stub.handler.sessions)} connections.")
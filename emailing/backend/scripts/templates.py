@@ -0,0 +1,82 @@
+import os
+import re
+from functools import lru_cache
+
+######################################################################
+# CONFIGURATION
+######################################################################
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+TEMPLATES_DIR = os.path.join(PROJECT_ROOT, "backend", "templates")
+
+# [FIRST_NAME] in a template is filled with the "first_name" column of the contact list
+PLACEHOLDER = re.compile(r"\[([A-Z][A-Z0-9_]*)\]")
+
+######################################################################
+# TEMPLATES
+######################################################################
+class Template:
+    """A template parsed once into literal pieces and the slots where the recipient's values go."""
+
+    def __init__(self, source, name="template"):
+        self.source = source
+        self.name = name
+        self.pieces = []  # literal text, with None where a value goes
+        self.slots = []  # (index in pieces, column)
+        last = 0
+        for match in PLACEHOLDER.finditer(source):
+            self.pieces.append(source[last:match.start()])
+            self.slots.append((len(self.pieces), match.group(1).lower()))
+            self.pieces.append(None)
+            last = match.end()
+        self.pieces.append(source[last:])
+        self.columns = list(dict.fromkeys(column for _, column in self.slots))
+
+    def missing(self, columns):
+        """Placeholders with no matching column, e.g. ["[COMPANY]"]."""
+        return [f"[{column.upper()}]" for column in self.columns if column not in columns]
+
+    def render(self, values):
+        pieces = self.pieces.copy()
+        for index, column in self.slots:
+            pieces[index] = values[column]
+        return "".join(pieces)
+
+
+class EmailTemplate:
+    """Subject and body of one language: template_<language>.txt and subject_<language>.txt."""
+
+    def __init__(self, language, subject, body):
+        self.language = language
+        self.subject = subject
+        self.body = body
+        self.columns = list(dict.fromkeys(subject.columns + body.columns))
+
+    def missing(self, columns):
+        columns = set(columns)
+        return list(dict.fromkeys(self.subject.missing(columns) + self.body.missing(columns)))
+
+    def render(self, values):
+        return self.subject.render(values), self.body.render(values)
+
+
+@lru_cache(maxsize=None)
+def _parse(path, mtime, strip):
+    # keyed on the modification time: an edited template is parsed again, an unchanged one only once
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    return Template(source.strip() if strip else source, name=os.path.basename(path))
+
+
+def load_template(path, strip=False):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Template not found: {path}")
+    return _parse(path, os.stat(path).st_mtime_ns, strip)
+
+
+def load_email_template(language, directory=TEMPLATES_DIR):
+    """Loads a language only when it is used, so a missing template only matters for that language."""
+    return EmailTemplate(
+        language,
+        subject=load_template(os.path.join(directory, f"subject_{language}.txt"), strip=True),  # one line
+        body=load_template(os.path.join(directory, f"template_{language}.txt")),
+    )
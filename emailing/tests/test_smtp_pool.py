@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import socket
+import smtplib
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts"))
+from smtp_pool import SMTPPool, DeliveryUnknown
+from smtp_stub import SMTPStub
+from campaign import Campaign
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def message(to="someone@example.com"):
+    msg = EmailMessage()
+    msg["From"] = "me@example.com"
+    msg["To"] = to
+    msg["Subject"] = "Hello"
+    msg.set_content("Hi")
+    return msg
+
+
+@pytest.fixture
+def port():
+    return free_port()
+
+
+@pytest.fixture
+def stub(port):
+    with SMTPStub(port=port) as stub:
+        yield stub
+
+
+def make_pool(port, **kwargs):
+    kwargs.setdefault("starttls", False)
+    kwargs.setdefault("timeout", 5)
+    return SMTPPool("127.0.0.1", port, **kwargs)
+
+
+def test_connection_is_reused(stub, port):
+    with make_pool(port) as pool:
+        for _ in range(5):
+            pool.send(message())
+    assert len(stub.handler.messages) == 5
+    assert len(stub.handler.sessions) == 1
+    assert pool.stats == {"sent": 5, "connections": 1, "reconnects": 0}
+
+
+def test_connection_is_recycled_after_max_messages(stub, port):
+    with make_pool(port, max_messages_per_connection=2) as pool:
+        for _ in range(5):
+            pool.send(message())
+    assert len(stub.handler.messages) == 5
+    assert pool.stats["connections"] == 3
+
+
+def test_sends_are_paced_by_the_rate(stub, port):
+    with make_pool(port, rate=20, burst=1) as pool:
+        start = time.monotonic()
+        for _ in range(5):
+            pool.send(message())
+        elapsed = time.monotonic() - start
+    assert elapsed >= 0.18  # the first send uses the burst, the next four wait 1/20s each
+
+
+def test_refused_message_keeps_the_connection(port):
+    with SMTPStub(port=port, fail_every=2) as stub, make_pool(port) as pool:
+        pool.send(message())
+        with pytest.raises(smtplib.SMTPDataError):
+            pool.send(message())
+        pool.send(message())
+    assert pool.stats["connections"] == 1
+    assert len(stub.handler.sessions) == 1
+
+
+def test_stale_connection_is_replaced(port):
+    with make_pool(port) as pool:
+        with SMTPStub(port=port):
+            pool.send(message())
+        with SMTPStub(port=port) as restarted:  # the pooled connection died with the first server
+            pool.send(message())
+    assert pool.stats["reconnects"] == 1
+    assert len(restarted.handler.messages) == 1
+
+
+def test_connection_lost_during_data_is_not_resent(port):
+    with SMTPStub(port=port, disconnect_every=1) as stub, make_pool(port) as pool:
+        with pytest.raises(DeliveryUnknown):
+            pool.send(message())
+    assert len(stub.handler.messages) == 1  # the server kept it: sending again would duplicate it
+
+
+def run_campaign(pool, jobs, workers=4, timeout=20):
+    """Runs a campaign in a thread and fails the test instead of hanging if it never finishes."""
+    events = []
+
+    def send(job):
+        pool.send(message(job["email"]))
+        return True
+
+    def run():
+        events.extend(Campaign(send, workers=workers, rate=None).stream(jobs))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "campaign did not finish"
+    return [event for event, _, _ in events]
+
+
+def jobs(n):
+    return [{"email": f"user{i}@domain{i % 3}.com"} for i in range(n)]
+
+
+def test_campaign_finishes_when_the_server_is_unreachable(port):
+    with make_pool(port, size=1, timeout=2) as pool:  # nothing listens on `port`
+        events = run_campaign(pool, jobs(8))
+    assert events.count("failed") == 8
+
+
+def test_campaign_with_more_workers_than_connections(stub, port):
+    with make_pool(port, size=1, max_messages_per_connection=1) as pool:
+        events = run_campaign(pool, jobs(8))
+    assert events.count("sent") == 8
+    assert len(stub.handler.messages) == 8